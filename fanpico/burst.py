@@ -0,0 +1,138 @@
+#
+# burst.py - High-rate (burst) capture of FanPico status
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import csv
+import logging as log
+import os
+import threading
+from array import array
+
+from .history import NAN, HistoryLog, status_columns
+
+
+class BurstCapture:
+    """
+    Samples captured while a unit is polled back-to-back (see FanPico.start_burst).
+    Samples are stored in a preallocated array (timestamp followed by one value per
+    column for each sample), so capturing does not allocate memory per sample.
+
+    Capture ends when duration has elapsed, the buffer is full, or (if until_stall
+    is set) post_trigger seconds after RPM of any fan drops to 0. Only fans seen
+    spinning during the capture count, so idle (unused) outputs do not trigger.
+    """
+
+    def __init__(self, columns, duration=10.0, max_samples=20000, until_stall=False, post_trigger=2.0):
+        self.columns = list(columns)
+        self.fields = [tuple(c.split('.', 1)) for c in self.columns]
+        self.width = len(self.columns) + 1
+        self.max_samples = max_samples
+        self.data = array('d', bytes(8 * self.width * max_samples))
+        self.count = 0
+        self.duration = duration
+        self.until_stall = until_stall
+        self.post_trigger = post_trigger
+        self.stall_columns = [i + 1 for i, c in enumerate(self.columns) if c.endswith('.rpm')]
+        self.spinning = set()
+        self.start_t = None
+        self.trigger_t = None
+        self.done = threading.Event()
+
+    @classmethod
+    def from_status(cls, status, **kwargs):
+        """Create capture for all numeric columns of a status snapshot."""
+        return cls([c for c, _ in status_columns(status)], **kwargs)
+
+    def add(self, status):
+        """Add status snapshot. Returns True once capture has completed."""
+        if self.done.is_set():
+            return True
+        t = status['last_update']
+        if self.start_t is None:
+            self.start_t = t
+        data = self.data
+        row = self.count * self.width
+        data[row] = t
+        i = row
+        for k, field in self.fields:
+            i += 1
+            v = getattr(status.get(k), field, None)
+            data[i] = v if v is not None else NAN
+        self.count += 1
+
+        if self.until_stall and self.trigger_t is None:
+            for i in self.stall_columns:
+                v = data[row + i]
+                if v > 0:
+                    self.spinning.add(i)
+                elif v == 0 and i in self.spinning:
+                    self.trigger_t = t
+                    log.info("BurstCapture: stall detected (%s) at sample %d",
+                             self.columns[i - 1], self.count)
+                    break
+        if self.complete():
+            self.done.set()
+        return self.done.is_set()
+
+    def complete(self):
+        """Check if capture has reached its end condition (as opposed to having been stopped early)."""
+        if not self.count:
+            return False
+        t = self.data[(self.count - 1) * self.width]
+        return (self.count >= self.max_samples or t - self.start_t >= self.duration
+                or (self.trigger_t is not None and t - self.trigger_t >= self.post_trigger))
+
+    def rate(self):
+        """Return average sample rate (samples/sec)."""
+        if self.count < 2:
+            return 0.0
+        elapsed = self.data[(self.count - 1) * self.width] - self.data[0]
+        return (self.count - 1) / elapsed if elapsed > 0 else 0.0
+
+    def rows(self):
+        """Iterate captured samples as (timestamp, values) tuples."""
+        for n in range(self.count):
+            row = n * self.width
+            yield self.data[row], self.data[row + 1:row + self.width]
+
+    def save(self, output):
+        """Save samples as CSV (file object, or path ending in .csv) or as a history log file (other paths)."""
+        if not isinstance(output, str):
+            self._write_csv(output)
+        elif output.endswith('.csv'):
+            with open(output, 'w', newline='') as f:
+                self._write_csv(f)
+        else:
+            # each capture goes to a new file (HistoryLog would append to an existing one)
+            if os.path.exists(output):
+                os.remove(output)
+            hlog = HistoryLog(output, self.columns, batch_size=1000)
+            for t, values in self.rows():
+                hlog.append(t, values)
+            hlog.close()
+        log.info("BurstCapture: saved %d samples (%.1f samples/sec)", self.count, self.rate())
+
+    def _write_csv(self, f):
+        writer = csv.writer(f)
+        writer.writerow(['time'] + self.columns)
+        for t, values in self.rows():
+            writer.writerow([f'{t:.6f}'] + [f'{v:g}' for v in values])
+
+
+# eof :-)
@@ -0,0 +1,93 @@
+#
+# collector.py - Headless data collector for FanPico units
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging as log
+import csv
+import json
+import queue
+
+CSV_FIELDS = ['time', 'unit', 'channel', 'name', 'rpm', 'freq', 'pwm', 'temp']
+
+
+class Collector:
+    """
+    Write every new status snapshot from a set of FanPico units to a
+    stream as JSON lines (one object per snapshot) or CSV (one row per channel).
+    """
+
+    def __init__(self, output, fmt='json', header=True):
+        if fmt not in ('json', 'csv'):
+            raise ValueError(f"unsupported output format: {fmt}")
+        self.output = output
+        self.fmt = fmt
+        self.units = {}
+        self.history = {}
+        self.last_seq = {}
+        self.queue = queue.SimpleQueue()
+        self.csv = None
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(output, fieldnames=CSV_FIELDS)
+            if header:
+                self.csv.writeheader()
+
+    def add_unit(self, name, unit, history=None):
+        self.units[name] = unit
+        if history:
+            self.history[name] = history
+        unit.add_listener(lambda u: self.queue.put((name, u.get_status())))
+
+    def write(self, name, status):
+        t = status.get('last_update')
+        seq = status.get('seq')
+        if t is None or self.last_seq.get(name) == seq:
+            # no new data (notification was about state change)
+            return
+        self.last_seq[name] = seq
+        t = round(t, 3)
+        if name in self.history:
+            self.history[name].add(status)
+        channels = {k: v for k, v in sorted(status.items()) if k not in ('last_update', 'seq')}
+        if self.csv:
+            for k, v in channels.items():
+                row = {'time': t, 'unit': name, 'channel': k}
+                row.update(v._asdict())
+                self.csv.writerow(row)
+        else:
+            record = {'time': t, 'unit': name}
+            record.update({k: v._asdict() for k, v in channels.items()})
+            self.output.write(json.dumps(record) + '\n')
+        self.output.flush()
+
+    def run(self):
+        log.info("Collector: collecting data from %d unit(s)", len(self.units))
+        try:
+            while True:
+                name, status = self.queue.get()
+                self.write(name, status)
+        except KeyboardInterrupt:
+            log.info("Collector: interrupted")
+        finally:
+            for unit in self.units.values():
+                unit.close()
+            for history in self.history.values():
+                history.close()
+
+
+# eof :-)
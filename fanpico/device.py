@@ -0,0 +1,323 @@
+#
+# device.py - Interface for polling status of a FanPico unit
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging as log
+import random
+import threading
+import time
+from types import MappingProxyType
+
+import scpi_lite
+from . import network
+from .status import parse_status, FanStatus, SensorStatus, QueryPlan, Batch
+from .simulator import SimDevice
+from .stats import UnitStats
+
+
+# offset between monotonic clock and wall clock, fixed at startup
+_clock_offset = time.time() - time.monotonic()
+
+
+def timestamp():
+    """Return high resolution timestamp (seconds since epoch) that never goes backwards."""
+    return time.monotonic() + _clock_offset
+
+
+def parse_device(device):
+    """Split device string into (scheme, address) tuple. Plain paths are serial devices."""
+    if '://' in device:
+        scheme, address = device.split('://', 1)
+        return (scheme.lower(), address)
+    return ('serial', device)
+
+
+def open_device(device, baudrate=115200, timeout=2, verbose=0):
+    """Open (blocking) SCPI connection to a device."""
+    scheme, address = parse_device(device)
+    if scheme == 'sim':
+        return SimDevice(address, timeout=timeout, verbose=verbose)
+    if scheme in ('tcp', 'telnet'):
+        return network.pool.acquire(scheme, address, timeout=timeout, verbose=verbose)
+    if scheme != 'serial':
+        raise scpi_lite.SCPIError(f"unsupported device type: {scheme}")
+    return scpi_lite.SCPIDevice(address, baudrate=baudrate, timeout=timeout, verbose=verbose)
+
+
+def _delta(a, b):
+    """Return difference of two readings (0 if either is not available)."""
+    if a is None or b is None:
+        return 0
+    return abs(a - b)
+
+
+class Backoff:
+    """Exponential backoff (with jitter) for reconnect attempts."""
+
+    def __init__(self, base=0.5, maximum=30.0, factor=2.0):
+        self.base = base
+        self.maximum = maximum
+        self.factor = factor
+        self.attempt = 0
+
+    def reset(self):
+        self.attempt = 0
+
+    def next(self):
+        delay = min(self.maximum, self.base * self.factor ** self.attempt)
+        self.attempt += 1
+        return random.uniform(delay / 2, delay)
+
+
+class FanPico:
+    """
+    FanPico unit connection. Status is polled either by a worker thread
+    (default), or by a shared PollEngine when one is given. Connection is
+    supervised: if the link drops (or cannot be opened) it is retried
+    with exponential backoff.
+
+    Connection states: 'connecting', 'connected', 'backoff' (waiting to
+    reconnect), 'closed'.
+    """
+
+    def __init__(self, device, baudrate=115200, timeout=2, poll_interval=2.0,
+                 adaptive=False, fast_interval=0.25, query_plan=None, engine=None, verbose=0):
+        self.device = device
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.adaptive = adaptive
+        self.fast_interval = min(fast_interval, poll_interval)
+        self.interval = poll_interval
+        self.engine = engine
+        self.verbose = verbose
+        self.manufacturer = 'N/A'
+        self.model = 'N/A'
+        self.serial = 'N/A'
+        self.firmware = 'N/A'
+        self.state = 'connecting'
+        self.backoff = Backoff()
+        self.stopped = threading.Event()
+        self.status = MappingProxyType({})
+        self.seq = 0
+        self.burst = None
+        self.plan = None
+        self.full_poll = True
+        if query_plan:
+            try:
+                self.plan = QueryPlan(query_plan)
+            except ValueError as err:
+                log.error("FanPico(%s): %s (polling full status instead)", device, err)
+        self.listeners = []
+        self.stats = UnitStats()
+        self.dev = None
+        self.lock = threading.Lock()
+
+        if engine:
+            engine.add(self)
+            return
+
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def set_identity(self, manufacturer, model, serial, firmware):
+        self.manufacturer = manufacturer
+        self.model = model
+        self.serial = serial
+        self.firmware = firmware
+        self.set_state('connected')
+        # (re)read names and all fields after connecting
+        self.full_poll = True
+        log.info("FanPico: connected (%s, %s, v%s)", self.model, self.serial, self.firmware)
+
+    def set_state(self, state):
+        if state != self.state:
+            log.debug("FanPico(%s): state %s -> %s", self.device, self.state, state)
+            self.state = state
+
+    def connected(self):
+        if self.state == 'connected':
+            return 1
+        return 0
+
+    def close(self):
+        self.stopped.set()
+        self.set_state('closed')
+        if self.burst:
+            self.burst.done.set()
+        if self.engine:
+            self.engine.remove(self)
+        if self.dev:
+            self.dev.close()
+
+    def add_listener(self, callback):
+        """Register callback to be called (from worker thread) when new status is available."""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def start_burst(self, burst):
+        """Poll unit back-to-back (as fast as the link allows), feeding snapshots to burst until it completes."""
+        log.info("FanPico(%s): burst capture started", self.device)
+        self.burst = burst
+
+    def get_status(self):
+        # Worker replaces the (read-only) snapshot atomically, so no copying or locking needed here.
+        start = time.perf_counter()
+        status = self.status
+        self.stats.add('get_status', time.perf_counter() - start)
+        return status
+
+    @staticmethod
+    def _changing(old, new):
+        """Check if readings changed significantly between two snapshots."""
+        for k, v in new.items():
+            o = old.get(k)
+            if isinstance(v, FanStatus) and isinstance(o, FanStatus):
+                if _delta(v.pwm, o.pwm) >= 1.0 or _delta(v.rpm, o.rpm) > max(50, (o.rpm or 0) * 0.05):
+                    return True
+            elif isinstance(v, SensorStatus) and isinstance(o, SensorStatus):
+                if _delta(v.temp, o.temp) >= 0.5:
+                    return True
+        return False
+
+    def _next_interval(self, old, new):
+        if not self.adaptive:
+            return self.poll_interval
+        if self._changing(old, new):
+            return self.fast_interval
+        # back off gradually towards normal poll interval
+        return min(self.interval * 2, self.poll_interval)
+
+    def batch(self, cmds):
+        """Return Batch for sending queries to this unit."""
+        return Batch(cmds, (self.manufacturer, self.model))
+
+    def query_many(self, cmds):
+        """
+        Send queries back to back and return list of responses (in same order).
+        Queries are pipelined (one round trip) if the link supports it, otherwise
+        sent one by one. Can be called from any thread (except listeners called
+        by a PollEngine), waits for any poll in progress to complete first.
+        """
+        if self.engine:
+            return self.engine.query_many(self, cmds)
+        with self.lock:
+            if not self.dev or self.state != 'connected':
+                raise ConnectionError(f"{self.device}: not connected")
+            return self._query_batch(self.dev, self.batch(cmds))
+
+    @staticmethod
+    def _query_batch(dev, batch):
+        if getattr(dev, 'pipelining', False):
+            return dev.batch(batch)
+        return [dev.query(cmd, multi_line=multi_line) for cmd, multi_line in zip(batch.cmds, batch.multi_line)]
+
+    def poll_commands(self):
+        """Return list of (channel, field, command) to poll, or None if full status (R?) should be read."""
+        if not self.plan or self.full_poll:
+            return None
+        # plan matching no channels: poll full status
+        return self.plan.commands(self.status) or None
+
+    def publish(self, response):
+        """Parse R? response and publish it as new status snapshot. Returns delay until next poll."""
+        log.debug("FanPico(%s): response length: %d", self.device, len(response))
+        self.stats.add('response_size', len(response))
+        self.full_poll = False
+        return self._publish(parse_status(response))
+
+    def publish_values(self, responses):
+        """Publish responses to query plan commands: list of (channel, field, response) tuples."""
+        self.stats.add('response_size', sum(len(r) for _, _, r in responses))
+        return self._publish(self.plan.apply(self.status, responses))
+
+    def poll_batch(self, commands):
+        """Return Batch for poll_commands() result."""
+        return self.batch(['R?'] if commands is None else [cmd for _, _, cmd in commands])
+
+    def publish_batch(self, commands, responses):
+        """Publish responses to poll_batch(). Returns delay until next poll."""
+        if commands is None:
+            return self.publish(responses[0])
+        return self.publish_values([(k, f, r) for (k, f, _), r in zip(commands, responses)])
+
+    def _publish(self, updates):
+        old = self.status
+        status = dict(old)
+        status.update(updates)
+        # link is considered up only once a poll succeeds (not already when *IDN? is answered)
+        self.backoff.reset()
+        # seq identifies the snapshot, last_update is when it was received
+        self.seq += 1
+        status['seq'] = self.seq
+        status['last_update'] = timestamp()
+        self.status = MappingProxyType(status)
+        self.interval = self._next_interval(old, status)
+        burst = self.burst
+        if burst:
+            if not burst.add(status):
+                return 0
+            log.info("FanPico(%s): burst capture done (%d samples)", self.device, burst.count)
+            self.burst = None
+        return self.interval
+
+    def notify(self):
+        for callback in list(self.listeners):
+            try:
+                callback(self)
+            except Exception:
+                # a failing listener must not stop polling (or other listeners)
+                log.exception("FanPico(%s): listener failed", self.device)
+
+    def worker(self):
+        log.info("FanPico:worker(%s): started", self.device)
+        while not self.stopped.is_set():
+            self.set_state('connecting')
+            try:
+                dev = open_device(self.device, baudrate=self.baudrate,
+                                  timeout=self.timeout, verbose=self.verbose)
+                self.dev = dev
+                self.set_identity(dev.manufacturer, dev.model, dev.serial, dev.firmware)
+                self.notify()
+                while not self.stopped.is_set():
+                    commands = self.poll_commands()
+                    with self.lock, self.stats.timer('query'):
+                        res = self._query_batch(dev, self.poll_batch(commands))
+                    interval = self.publish_batch(commands, res)
+                    self.notify()
+                    self.stopped.wait(interval)
+            except (scpi_lite.SCPIError, OSError, ValueError) as err:
+                log.info("FanPico:worker(%s): error: %s", self.device, err)
+            if self.dev:
+                self.dev.close()
+                self.dev = None
+            if self.stopped.is_set():
+                break
+            delay = self.backoff.next()
+            log.info("FanPico:worker(%s): reconnecting in %.1fs", self.device, delay)
+            self.set_state('backoff')
+            self.notify()
+            self.stopped.wait(delay)
+        log.info("FanPico:worker: finished %s", self.device)
+
+
+# eof :-)
@@ -0,0 +1,156 @@
+#
+# exporter.py - Prometheus / OpenMetrics exporter for FanPico status
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging as log
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .device import timestamp
+from .status import FanStatus, SensorStatus
+
+OPENMETRICS_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+TEXT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# metric families: (name, type, help)
+FAMILIES = [
+    ('fanpico_up', 'gauge', 'Whether unit is currently connected.'),
+    ('fanpico_last_update_age_seconds', 'gauge', 'Time since last status update from unit.'),
+    ('fanpico_fan_rpm', 'gauge', 'Fan speed (RPM).'),
+    ('fanpico_fan_frequency_hertz', 'gauge', 'Fan tachometer signal frequency.'),
+    ('fanpico_fan_pwm_percent', 'gauge', 'Fan PWM duty cycle.'),
+    ('fanpico_mbfan_rpm', 'gauge', 'Motherboard fan (input) speed (RPM).'),
+    ('fanpico_mbfan_frequency_hertz', 'gauge', 'Motherboard fan (input) tachometer signal frequency.'),
+    ('fanpico_mbfan_pwm_percent', 'gauge', 'Motherboard fan (input) PWM duty cycle.'),
+    ('fanpico_sensor_temperature_celsius', 'gauge', 'Temperature sensor reading.'),
+]
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**kwargs):
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in kwargs.items()) + '}'
+
+
+def status_samples(unit_name, status):
+    """Return dictionary of metric family -> sample lines for a status snapshot."""
+    res = {}
+    for k, v in sorted(status.items()):
+        # readings that were not polled (None) are left out
+        if isinstance(v, FanStatus):
+            group = 'mbfan' if k.startswith('mbfan') else 'fan'
+            lbl = labels(unit=unit_name, channel=k, name=v.name)
+            for family, value in ((f'fanpico_{group}_rpm', v.rpm),
+                                  (f'fanpico_{group}_frequency_hertz', v.freq),
+                                  (f'fanpico_{group}_pwm_percent', v.pwm)):
+                if value is not None:
+                    res.setdefault(family, []).append(f'{family}{lbl} {value}')
+        elif isinstance(v, SensorStatus) and v.temp is not None:
+            lbl = labels(unit=unit_name, channel=k, name=v.name)
+            res.setdefault('fanpico_sensor_temperature_celsius', []).append(
+                f'fanpico_sensor_temperature_celsius{lbl} {v.temp}')
+    return res
+
+
+class MetricsExporter:
+    """
+    HTTP server exposing latest status of registered units at /metrics.
+    Metrics are rendered from the cached status snapshots, so scrapes never
+    cause any I/O with the units.
+    """
+
+    def __init__(self, port, address=''):
+        self.units = {}
+        self.cache = {}
+        self.lock = threading.Lock()
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+                body = exporter.render(openmetrics).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', OPENMETRICS_TYPE if openmetrics else TEXT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                log.debug("MetricsExporter: " + format, *args)
+
+        self.server = ThreadingHTTPServer((address, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        log.info("MetricsExporter: listening on port %d", self.server.server_address[1])
+
+    def add_unit(self, name, unit):
+        with self.lock:
+            self.units[name] = unit
+
+    def remove_unit(self, name):
+        with self.lock:
+            self.units.pop(name, None)
+            self.cache.pop(name, None)
+
+    def _samples(self, name, status):
+        cached = self.cache.get(name)
+        if cached and cached[0] is status:
+            return cached[1]
+        samples = status_samples(name, status)
+        self.cache[name] = (status, samples)
+        return samples
+
+    def render(self, openmetrics=True):
+        now = timestamp()
+        families = {}
+        with self.lock:
+            units = sorted(self.units.items())
+            for name, unit in units:
+                status = unit.get_status()
+                lbl = labels(unit=name)
+                families.setdefault('fanpico_up', []).append(f'fanpico_up{lbl} {unit.connected()}')
+                if 'last_update' in status:
+                    families.setdefault('fanpico_last_update_age_seconds', []).append(
+                        f'fanpico_last_update_age_seconds{lbl} {max(0.0, now - status["last_update"]):.3f}')
+                for family, lines in self._samples(name, status).items():
+                    families.setdefault(family, []).extend(lines)
+
+        out = []
+        for family, mtype, text in FAMILIES:
+            if family not in families:
+                continue
+            out.append(f'# HELP {family} {text}')
+            out.append(f'# TYPE {family} {mtype}')
+            out.extend(families[family])
+        if openmetrics:
+            out.append('# EOF')
+        return '\n'.join(out) + '\n'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# eof :-)
@@ -0,0 +1,246 @@
+#
+# history.py - Sample history (in-memory and on-disk) for FanPico units
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import re
+import json
+import mmap
+import struct
+import logging as log
+from array import array
+
+from .series import TimeSeries
+from .status import FanStatus, SensorStatus
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b'FPMLOG1\n'
+NAN = float('nan')
+
+# default rollup tiers: (bucket length in seconds, number of buckets)
+ROLLUPS = ((10, 1500), (60, 1500), (600, 1500))
+
+
+def status_columns(status):
+    """Return (column, value) pairs of numeric fields in a status snapshot."""
+    res = []
+    for k, v in sorted(status.items()):
+        if isinstance(v, FanStatus):
+            res.append((k + '.rpm', v.rpm))
+            res.append((k + '.pwm', v.pwm))
+        elif isinstance(v, SensorStatus):
+            res.append((k + '.temp', v.temp))
+    return res
+
+
+def plot_column(channel):
+    """Return name of the column plotted for a channel."""
+    if channel.startswith('sensor'):
+        return channel + '.temp'
+    return channel + '.pwm'
+
+
+class HistoryLog:
+    """
+    Append-only log of fixed width binary records (float64 timestamp followed
+    by a float32 for each column). The file starts with a header listing the
+    column names. Records are written in batches and read back through mmap.
+    """
+
+    def __init__(self, path, columns, batch_size=30, flush_interval=10.0):
+        self.path = path
+        self.columns = list(columns)
+        self.record = struct.Struct('<d' + 'f' * len(self.columns))
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.last_flush = None
+
+        if os.path.exists(path) and self._read_header() != self.columns:
+            log.info("HistoryLog: channels changed, rotating: %s", path)
+            os.replace(path, path + '.old')
+        if not os.path.exists(path):
+            header = json.dumps({'columns': self.columns}).encode()
+            with open(path, 'wb') as f:
+                f.write(MAGIC + struct.pack('<I', len(header)) + header)
+        self.header_size = self._header_size()
+        self.file = open(path, 'ab')
+        # drop partially written record (if program was killed while writing)
+        extra = (self.file.tell() - self.header_size) % self.record.size
+        if extra:
+            self.file.truncate(self.file.tell() - extra)
+
+    def _read_header(self):
+        try:
+            with open(self.path, 'rb') as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    return None
+                size = struct.unpack('<I', f.read(4))[0]
+                return json.loads(f.read(size))['columns']
+        except (OSError, ValueError, KeyError, struct.error):
+            return None
+
+    def _header_size(self):
+        with open(self.path, 'rb') as f:
+            f.seek(len(MAGIC))
+            return len(MAGIC) + 4 + struct.unpack('<I', f.read(4))[0]
+
+    def append(self, t, values):
+        self.pending.append(self.record.pack(t, *values))
+        if self.last_flush is None:
+            self.last_flush = t
+        if len(self.pending) >= self.batch_size or t - self.last_flush >= self.flush_interval:
+            self.flush()
+            self.last_flush = t
+
+    def flush(self):
+        if self.pending:
+            self.file.write(b''.join(self.pending))
+            self.file.flush()
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def _find(self, mm, count, t_min):
+        lo = 0
+        hi = count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if struct.unpack_from('<d', mm, self.header_size + mid * self.record.size)[0] < t_min:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def read(self, columns, t_min=None):
+        """Return timestamps and values of given columns (as arrays) for records from t_min onwards."""
+        self.flush()
+        idx = [self.columns.index(c) for c in columns]
+        times = array('d')
+        values = {c: array('d') for c in columns}
+        size = os.path.getsize(self.path)
+        count = (size - self.header_size) // self.record.size
+        if count <= 0:
+            return times, values
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            first = self._find(mm, count, t_min) if t_min is not None else 0
+            start = self.header_size + first * self.record.size
+            end = self.header_size + count * self.record.size
+            if np is not None:
+                dtype = np.dtype([('t', '<f8'), ('v', '<f4', (len(self.columns),))])
+                rec = np.frombuffer(mm, dtype=dtype, count=count - first, offset=start)
+                times.frombytes(rec['t'].tobytes())
+                for c, i in zip(columns, idx):
+                    values[c].frombytes(rec['v'][:, i].astype(np.float64).tobytes())
+                del rec
+            else:
+                with memoryview(mm)[start:end] as mv:
+                    for r in self.record.iter_unpack(mv):
+                        times.append(r[0])
+                        for c, i in zip(columns, idx):
+                            values[c].append(r[i + 1])
+        return times, values
+
+
+class UnitHistory:
+    """
+    Sample history of a single FanPico unit: ring buffer (TimeSeries) per
+    plotted channel, with rollup tiers for long time ranges, optionally
+    backed by a HistoryLog file on disk.
+    """
+
+    def __init__(self, name, capacity=256, log_dir=None, rollups=ROLLUPS):
+        self.name = name
+        self.capacity = capacity
+        self.rollups = rollups
+        self.log_dir = log_dir
+        self.log = None
+        self.last_t = None
+        self.last_seq = None
+        self.data = {}
+
+    def series(self, channel):
+        if channel not in self.data:
+            self.data[channel] = TimeSeries(capacity=self.capacity, rollups=self.rollups)
+        return self.data[channel]
+
+    def _open_log(self, columns, channels, t_min):
+        filename = re.sub(r'[^\w.-]', '_', self.name) + '.fpl'
+        path = os.path.join(self.log_dir, filename)
+        try:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self.log = HistoryLog(path, columns)
+        except OSError as err:
+            log.error("UnitHistory(%s): cannot open history log: %s", self.name, err)
+            self.log_dir = None
+            return
+        if t_min is None:
+            return
+        # preload in-memory series from the log
+        plot_columns = {plot_column(k): k for k in channels}
+        times, values = self.log.read(list(plot_columns), t_min)
+        log.info("UnitHistory(%s): loaded %d records from %s", self.name, len(times), path)
+        for col, k in plot_columns.items():
+            s = self.series(k)
+            for t, v in zip(times, values[col]):
+                if v == v:
+                    # (not NaN)
+                    s.append(t, v)
+
+    def add(self, status, t_range=None):
+        """Add status snapshot to history (t_range seconds of earlier history is preloaded from disk)."""
+        t = status['last_update']
+        seq = status.get('seq')
+        if (seq is not None and seq == self.last_seq) or (self.last_t is not None and t <= self.last_t):
+            # same snapshot seen already (or older one)
+            return
+        self.last_seq = seq
+        self.last_t = t
+        values = {}
+        for k, v in status.items():
+            if isinstance(v, FanStatus):
+                values[k] = v.pwm
+            elif isinstance(v, SensorStatus):
+                values[k] = v.temp
+        columns = status_columns(status)
+        names = [c for c, _ in columns]
+        if self.log and names != self.log.columns:
+            self.close()
+        if self.log_dir and not self.log:
+            self._open_log(names, values, t - t_range if t_range else None)
+        for k, v in values.items():
+            if v is not None:
+                self.series(k).append(t, v)
+        if self.log:
+            # readings not available (not polled) are stored as NaN
+            self.log.append(t, [NAN if v is None else v for _, v in columns])
+
+    def close(self):
+        if self.log:
+            self.log.close()
+            self.log = None
+
+
+# eof :-)
@@ -0,0 +1,247 @@
+#
+# network.py - TCP/telnet connections to FanPico units (with connection pooling)
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging as log
+import select
+import socket
+import threading
+import time
+
+from .status import Batch, parse_idn
+
+# telnet protocol bytes
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+
+
+def parse_address(address, default_port=None):
+    """Split 'host:port' (or '[ipv6]:port') into (host, port) tuple."""
+    host, sep, port = address.rpartition(':')
+    if not sep or host.endswith(':') or address.endswith(']'):
+        # no port given (or bare IPv6 address)
+        host, port = address, default_port
+    if port is None:
+        raise ValueError(f"port missing from address: {address}")
+    return (host.strip('[]'), int(port))
+
+
+class TelnetFilter:
+    """
+    Strip telnet commands from received data. Option negotiation requests
+    are refused (DO -> WONT, WILL -> DONT), so the connection stays a plain
+    (NVT) byte stream. State is kept across calls, so commands split between
+    received chunks are handled.
+    """
+
+    def __init__(self):
+        self.state = None
+
+    def feed(self, data):
+        """Return (data, reply) where data has telnet commands removed and reply should be sent back."""
+        out = bytearray()
+        reply = bytearray()
+        for b in data:
+            state = self.state
+            if state is None:
+                if b == IAC:
+                    self.state = IAC
+                else:
+                    out.append(b)
+            elif state == IAC:
+                if b == IAC:
+                    out.append(b)
+                    self.state = None
+                elif b in (DO, DONT, WILL, WONT):
+                    self.state = b
+                elif b == SB:
+                    self.state = SB
+                else:
+                    self.state = None
+            elif state in (DO, DONT, WILL, WONT):
+                if state == DO:
+                    reply += bytes((IAC, WONT, b))
+                elif state == WILL:
+                    reply += bytes((IAC, DONT, b))
+                self.state = None
+            elif state == SB:
+                if b == IAC:
+                    self.state = 'SB-IAC'
+            elif state == 'SB-IAC':
+                self.state = None if b == SE else SB
+        return bytes(out), bytes(reply)
+
+
+class TCPDevice:
+    """
+    SCPI connection to a unit over TCP (tcp://host:port), or telnet
+    (telnet://host[:port]). Implements the same interface as scpi_lite.SCPIDevice,
+    plus batch() for sending multiple queries at once.
+    """
+
+    pipelining = True
+
+    def __init__(self, address, timeout=2, telnet=False, pool=None, verbose=0):
+        self.address = address
+        self.timeout = timeout
+        self.verbose = verbose
+        self.pool = pool
+        self.key = ('telnet' if telnet else 'tcp', address)
+        self.filter = TelnetFilter() if telnet else None
+        self.broken = False
+        self.released = False
+        self.lock = threading.Lock()
+        self.idn = None
+        host, port = parse_address(address, 23 if telnet else None)
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.manufacturer, self.model, self.serial, self.firmware = parse_idn(self.query('*IDN?'))
+        self.idn = (self.manufacturer, self.model)
+        log.debug("TCPDevice(%s): connected: %s", address, self.model)
+
+    def _recv(self, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout('timeout waiting for response')
+        self.sock.settimeout(remaining)
+        data = self.sock.recv(4096)
+        if not data:
+            raise ConnectionError('connection closed')
+        if self.filter:
+            data, reply = self.filter.feed(data)
+            if reply:
+                self.sock.sendall(reply)
+        return data
+
+    def _discard_input(self):
+        """Drop any stale (unread) data, e.g. left over from an earlier timed out query."""
+        while select.select([self.sock], [], [], 0)[0]:
+            self.sock.setblocking(False)
+            try:
+                data = self.sock.recv(4096)
+            finally:
+                self.sock.setblocking(True)
+            if not data:
+                raise ConnectionError('connection closed')
+
+    def query(self, cmd, multi_line=False):
+        # (multi-line responses are recognized by the command, see Batch)
+        return self.batch(Batch([cmd], self.idn))[0]
+
+    def batch(self, batch):
+        """Send all queries of a Batch in one go, then read their responses."""
+        if not batch.cmds:
+            return []
+        with self.lock:
+            if self.broken:
+                raise ConnectionError('connection closed')
+            try:
+                self._discard_input()
+                self.sock.sendall(''.join(cmd + '\n' for cmd in batch.commands()).encode())
+                deadline = time.monotonic() + self.timeout
+                while not batch.receive(self._recv(deadline)):
+                    pass
+            except OSError:
+                # (after a timeout, late responses would be mixed up with responses to next queries)
+                self.broken = True
+                self.sock.close()
+                raise
+            return batch.result()
+
+    def alive(self):
+        """Check (without blocking) that connection has not been closed by the other end."""
+        try:
+            if select.select([self.sock], [], [], 0)[0]:
+                return self.sock.recv(1, socket.MSG_PEEK) != b''
+        except OSError:
+            return False
+        return True
+
+    def close(self):
+        if self.released:
+            return
+        if not self.lock.acquire(blocking=False):
+            # closed while query in progress (from another thread): abort the query
+            self.broken = True
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return
+        try:
+            self.released = True
+            if self.pool and not self.broken:
+                self.pool.release(self)
+            else:
+                self.sock.close()
+        finally:
+            self.lock.release()
+
+
+class ConnectionPool:
+    """
+    Pool of idle (already connected and identified) TCP connections. Closing a
+    connection returns it to the pool, so reconnecting to the same unit (for
+    example when its view is reopened) needs no new TCP handshake or *IDN? query.
+    """
+
+    def __init__(self, max_idle=2, idle_time=60.0):
+        self.max_idle = max_idle
+        self.idle_time = idle_time
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, scheme, address, timeout=2, verbose=0):
+        key = (scheme, address)
+        with self.lock:
+            conns = self.idle.get(key, [])
+            while conns:
+                conn, released = conns.pop()
+                if time.monotonic() - released < self.idle_time and conn.alive():
+                    log.debug("ConnectionPool: reusing connection to %s://%s", scheme, address)
+                    conn.timeout = timeout
+                    conn.released = False
+                    return conn
+                conn.sock.close()
+        return TCPDevice(address, timeout=timeout, telnet=(scheme == 'telnet'), pool=self, verbose=verbose)
+
+    def release(self, conn):
+        with self.lock:
+            conns = self.idle.setdefault(conn.key, [])
+            conns.append((conn, time.monotonic()))
+            while len(conns) > self.max_idle:
+                conns.pop(0)[0].sock.close()
+
+    def close(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for conn, _ in conns:
+                    conn.sock.close()
+            self.idle = {}
+
+
+pool = ConnectionPool()
+
+
+# eof :-)
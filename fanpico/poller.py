@@ -0,0 +1,310 @@
+#
+# poller.py - Shared asyncio based poller for multiple FanPico units
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging as log
+import asyncio
+import queue
+import random
+import socket
+import threading
+import serial
+from .device import parse_device
+from .network import TelnetFilter, parse_address
+from .simulator import SimDevice
+from .status import Batch, parse_idn
+
+
+class AsyncTransport:
+    """Base class for non-blocking SCPI transports (line based request/response)."""
+
+    def __init__(self):
+        self.pending = None
+        self.data_ready = asyncio.Event()
+        self.closed = False
+        # (manufacturer, model) once known, needed for multi-line queries
+        self.idn = None
+
+    def _received(self, data):
+        if self.pending and self.pending.receive(data):
+            self.data_ready.set()
+
+    async def query(self, cmd, timeout=2):
+        return (await self.batch(Batch([cmd], self.idn), timeout))[0]
+
+    async def batch(self, batch, timeout=2):
+        """Send all queries of a Batch in one write, then wait for their responses."""
+        if not batch.cmds:
+            return []
+        if self.closed:
+            raise ConnectionError('connection closed')
+        self.pending = batch
+        self.data_ready.clear()
+        try:
+            self.write(''.join(cmd + '\n' for cmd in batch.commands()).encode())
+            await asyncio.wait_for(self.data_ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            # late responses would be mixed up with responses to next queries
+            self.close()
+            raise
+        finally:
+            self.pending = None
+        if not batch.done():
+            raise ConnectionError('connection closed')
+        return batch.result()
+
+    async def open(self):
+        raise NotImplementedError
+
+    def write(self, data):
+        raise NotImplementedError
+
+    def close(self):
+        self.closed = True
+
+
+class AsyncSerialTransport(AsyncTransport):
+    """Serial port transport using non-blocking reads driven by the event loop."""
+
+    def __init__(self, device, baudrate):
+        super().__init__()
+        self.device = device
+        self.baudrate = int(baudrate)
+        self.ser = None
+        self.reader = False
+        self.poll_task = None
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self.ser = serial.Serial(self.device, self.baudrate, timeout=0)
+        try:
+            loop.add_reader(self.ser.fileno(), self._read_ready)
+            self.reader = True
+        except (AttributeError, NotImplementedError, OSError):
+            # no selectable file descriptor (Windows), fall back to polling
+            self.poll_task = loop.create_task(self._poll())
+
+    def _read_ready(self):
+        try:
+            data = self.ser.read(self.ser.in_waiting or 1)
+        except serial.SerialException as err:
+            log.debug("AsyncSerialTransport(%s): read failed: %s", self.device, err)
+            self.close()
+            self.data_ready.set()
+            return
+        if data:
+            self._received(data)
+
+    async def _poll(self):
+        while not self.closed:
+            if self.ser.in_waiting:
+                self._read_ready()
+            await asyncio.sleep(0.02)
+
+    def write(self, data):
+        self.ser.write(data)
+
+    def close(self):
+        super().close()
+        if self.reader:
+            asyncio.get_running_loop().remove_reader(self.ser.fileno())
+            self.reader = False
+        if self.poll_task:
+            self.poll_task.cancel()
+        if self.ser:
+            self.ser.close()
+
+
+class AsyncTCPTransport(AsyncTransport):
+    """TCP socket transport (device string: tcp://host:port, or telnet://host[:port])."""
+
+    def __init__(self, address, telnet=False):
+        super().__init__()
+        self.host, self.port = parse_address(address, 23 if telnet else None)
+        self.filter = TelnetFilter() if telnet else None
+        self.writer = None
+        self.read_task = None
+
+    async def open(self):
+        reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        sock = self.writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.read_task = asyncio.get_running_loop().create_task(self._read_loop(reader))
+
+    async def _read_loop(self, reader):
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                break
+            if self.filter:
+                data, reply = self.filter.feed(data)
+                if reply:
+                    self.writer.write(reply)
+            self._received(data)
+        self.closed = True
+        self.data_ready.set()
+
+    def write(self, data):
+        self.writer.write(data)
+
+    def close(self):
+        super().close()
+        if self.read_task:
+            self.read_task.cancel()
+        if self.writer:
+            self.writer.close()
+
+
+class AsyncSimTransport(AsyncTransport):
+    """Simulated unit (device string: sim://options)."""
+
+    def __init__(self, options):
+        super().__init__()
+        self.sim = SimDevice(options)
+
+    async def open(self):
+        pass
+
+    async def query(self, cmd, timeout=2):
+        await asyncio.sleep(self.sim.delay())
+        return self.sim.response(cmd)
+
+    async def batch(self, batch, timeout=2):
+        await asyncio.sleep(self.sim.delay())
+        if batch.cmds and not batch.receive(self.sim.output(batch.commands())):
+            raise asyncio.TimeoutError()
+        return batch.result()
+
+
+def open_transport(device, baudrate):
+    scheme, address = parse_device(device)
+    if scheme in ('tcp', 'telnet'):
+        return AsyncTCPTransport(address, telnet=(scheme == 'telnet'))
+    if scheme == 'sim':
+        return AsyncSimTransport(address)
+    if scheme == 'serial':
+        return AsyncSerialTransport(address, baudrate)
+    raise ValueError(f"unsupported device type: {scheme}")
+
+
+class PollEngine:
+    """
+    Single asyncio event loop (running in its own thread) that polls any
+    number of FanPico units. Listeners of each unit are called from a
+    separate dispatcher thread, so slow listeners never stall the polling.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.tasks = {}
+        self.connections = {}
+        self.notify_queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.thread.start()
+        self.dispatcher.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _dispatch(self):
+        while True:
+            unit = self.notify_queue.get()
+            try:
+                unit.notify()
+            except Exception:
+                log.exception("PollEngine(%s): notify failed", unit.device)
+
+    def add(self, unit):
+        self.loop.call_soon_threadsafe(self._start, unit)
+
+    def remove(self, unit):
+        self.loop.call_soon_threadsafe(self._stop, unit)
+
+    def _start(self, unit):
+        if unit not in self.tasks:
+            self.tasks[unit] = self.loop.create_task(self._poll_unit(unit))
+
+    def _stop(self, unit):
+        task = self.tasks.pop(unit, None)
+        if task:
+            task.cancel()
+
+    async def _poll_unit(self, unit):
+        log.info("PollEngine(%s): started", unit.device)
+        try:
+            while True:
+                await self._connect_and_poll(unit)
+                delay = unit.backoff.next()
+                log.info("PollEngine(%s): reconnecting in %.1fs", unit.device, delay)
+                unit.set_state('backoff')
+                self.notify_queue.put(unit)
+                await asyncio.sleep(delay)
+        except ValueError as err:
+            log.error("PollEngine(%s): %s", unit.device, err)
+        finally:
+            self.tasks.pop(unit, None)
+        log.info("PollEngine(%s): finished", unit.device)
+
+    async def _connect_and_poll(self, unit):
+        unit.set_state('connecting')
+        transport = open_transport(unit.device, unit.baudrate)
+        try:
+            await asyncio.wait_for(transport.open(), unit.timeout)
+            idn = await transport.query('*IDN?', timeout=unit.timeout)
+            unit.set_identity(*parse_idn(idn))
+            transport.idn = (unit.manufacturer, unit.model)
+            self.notify_queue.put(unit)
+            # spread the polls of different units evenly
+            await asyncio.sleep(random.uniform(0, unit.poll_interval))
+            lock = asyncio.Lock()
+            self.connections[unit] = (transport, lock)
+            while True:
+                commands = unit.poll_commands()
+                async with lock:
+                    with unit.stats.timer('query'):
+                        res = await transport.batch(unit.poll_batch(commands), timeout=unit.timeout)
+                interval = unit.publish_batch(commands, res)
+                self.notify_queue.put(unit)
+                await asyncio.sleep(interval)
+        except (OSError, asyncio.TimeoutError) as err:
+            log.info("PollEngine(%s): error: %s", unit.device, err)
+        finally:
+            self.connections.pop(unit, None)
+            transport.close()
+
+    def query_many(self, unit, cmds):
+        """Send queries (as a batch) to unit from another thread, see FanPico.query_many."""
+        return asyncio.run_coroutine_threadsafe(self._query_many(unit, cmds), self.loop).result()
+
+    async def _query_many(self, unit, cmds):
+        conn = self.connections.get(unit)
+        if not conn:
+            raise ConnectionError(f"{unit.device}: not connected")
+        transport, lock = conn
+        async with lock:
+            try:
+                return await transport.batch(unit.batch(cmds), timeout=unit.timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{unit.device}: timeout waiting for response") from None
+
+
+# eof :-)
@@ -0,0 +1,109 @@
+#
+# serial_ports.py - Background (cached) enumeration of serial ports
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging as log
+import os
+import threading
+import time
+
+
+def port_name(port):
+    """Return device name to use for a serial port (ListPortInfo)."""
+    name = port.name
+    if name.startswith("COM"):
+        return name + ':'
+    if name.startswith("/"):
+        return name
+    return "/dev/" + name
+
+
+class PortScanner:
+    """
+    Enumerate serial ports in a background thread and cache the result.
+    Ports are rescanned when /dev changes (hotplug, on systems that have /dev),
+    when refresh() is called, or every max_age seconds.
+    'version' is incremented whenever the list of ports changes.
+    """
+
+    def __init__(self, interval=2.0, max_age=30.0):
+        self.interval = interval
+        self.max_age = max_age
+        self.ports = None
+        self.version = 0
+        self.thread = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def start(self):
+        with self.lock:
+            if not self.thread:
+                self.thread = threading.Thread(target=self.worker, daemon=True)
+                self.thread.start()
+
+    def refresh(self):
+        """Request rescan (ports are updated asynchronously)."""
+        self.start()
+        self.wakeup.set()
+
+    def get(self):
+        """Return cached list of ports (None if first scan has not completed yet)."""
+        self.start()
+        return self.ports
+
+    @staticmethod
+    def _dev_stamp():
+        try:
+            return os.stat('/dev').st_mtime_ns
+        except OSError:
+            return None
+
+    def scan(self):
+        import serial.tools.list_ports
+        start = time.perf_counter()
+        ports = [port_name(p) for p in serial.tools.list_ports.comports()]
+        log.debug("PortScanner: found %d port(s) in %.3fs", len(ports), time.perf_counter() - start)
+        if ports != self.ports:
+            self.ports = ports
+            self.version += 1
+
+    def worker(self):
+        stamp = None
+        last_scan = 0
+        while True:
+            new_stamp = self._dev_stamp()
+            if (self.ports is None or self.wakeup.is_set() or new_stamp != stamp
+                    or time.monotonic() - last_scan >= self.max_age):
+                self.wakeup.clear()
+                stamp = new_stamp
+                last_scan = time.monotonic()
+                try:
+                    self.scan()
+                except Exception as err:
+                    log.error("PortScanner: cannot list serial ports: %s", err)
+                    if self.ports is None:
+                        self.ports = []
+                        self.version += 1
+            self.wakeup.wait(self.interval)
+
+
+port_scanner = PortScanner()
+
+
+# eof :-)
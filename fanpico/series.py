@@ -0,0 +1,188 @@
+#
+# series.py - Fixed capacity time-series storage for FanPico samples
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from array import array
+from typing import Iterator, Optional, Sequence, Tuple
+
+
+class Rollup:
+    """
+    Ring buffer of fixed length time buckets (step seconds each), keeping
+    min/sum/count/max of the samples in each bucket. Buckets are updated
+    incrementally as samples arrive.
+    """
+
+    def __init__(self, step: float, capacity: int = 1500):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.step = step
+        self.capacity = capacity
+        self.b = array('q', bytes(8 * capacity))
+        self.sums = array('d', bytes(8 * capacity))
+        self.mins = array('d', bytes(8 * capacity))
+        self.maxs = array('d', bytes(8 * capacity))
+        self.count = array('q', bytes(8 * capacity))
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _index(self, i: int) -> int:
+        return (self.start + i) % self.capacity
+
+    def add(self, t: float, value: float):
+        b = int(t // self.step)
+        if self.size > 0:
+            last = self._index(self.size - 1)
+            if self.b[last] == b:
+                self.sums[last] += value
+                self.count[last] += 1
+                if value < self.mins[last]:
+                    self.mins[last] = value
+                if value > self.maxs[last]:
+                    self.maxs[last] = value
+                return
+            if b < self.b[last]:
+                # too old (out of order) sample
+                return
+        if self.size < self.capacity:
+            i = self._index(self.size)
+            self.size += 1
+        else:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.b[i] = b
+        self.sums[i] = value
+        self.mins[i] = value
+        self.maxs[i] = value
+        self.count[i] = 1
+
+    def last(self) -> Optional[Tuple[float, int]]:
+        """Return (start time, sample count) of the newest bucket."""
+        if self.size == 0:
+            return None
+        i = self._index(self.size - 1)
+        return (self.b[i] * self.step, self.count[i])
+
+    def find(self, t_min: float) -> int:
+        """Return (logical) index of first bucket that ends after t_min."""
+        b_min = int(t_min // self.step)
+        lo = 0
+        hi = self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.b[self._index(mid)] < b_min:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def items(self, t_min: Optional[float] = None) -> Iterator[Tuple[float, float, float, float, int]]:
+        """Iterate buckets as (start time, sum, min, max, count) tuples in chronological order."""
+        first = self.find(t_min) if t_min is not None else 0
+        for i in range(first, self.size):
+            j = self._index(i)
+            yield (self.b[j] * self.step, self.sums[j], self.mins[j], self.maxs[j], self.count[j])
+
+
+class TimeSeries:
+    """
+    Ring buffer of (timestamp, value) samples for a single channel.
+    Once capacity is reached, oldest samples are overwritten by new ones,
+    so memory use stays constant no matter how long the program runs.
+    Timestamps are expected to be non-decreasing.
+
+    Optionally samples are also aggregated into rollup tiers, given as
+    (step, capacity) tuples, for plotting long time ranges.
+    """
+
+    def __init__(self, capacity: int = 256, rollups: Sequence[Tuple[float, int]] = ()):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.t = array('d', bytes(8 * capacity))
+        self.v = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.size = 0
+        self.rollups = [Rollup(step, size) for step, size in rollups]
+
+    def __len__(self):
+        return self.size
+
+    def _index(self, i: int) -> int:
+        return (self.start + i) % self.capacity
+
+    def append(self, t: float, value: float):
+        if self.size > 0:
+            last = self._index(self.size - 1)
+            if self.t[last] == t:
+                # same sample seen again, just refresh the value
+                self.v[last] = value
+                return
+        if self.size < self.capacity:
+            i = self._index(self.size)
+            self.size += 1
+        else:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.t[i] = t
+        self.v[i] = value
+        for r in self.rollups:
+            r.add(t, value)
+
+    def last(self) -> Optional[Tuple[float, float]]:
+        if self.size == 0:
+            return None
+        i = self._index(self.size - 1)
+        return (self.t[i], self.v[i])
+
+    def find(self, t_min: float) -> int:
+        """Return (logical) index of first sample with timestamp >= t_min."""
+        lo = 0
+        hi = self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.t[self._index(mid)] < t_min:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def items(self, t_min: Optional[float] = None) -> Iterator[Tuple[float, float]]:
+        """Iterate samples in chronological order (optionally starting from t_min)."""
+        first = self.find(t_min) if t_min is not None else 0
+        for i in range(first, self.size):
+            j = self._index(i)
+            yield (self.t[j], self.v[j])
+
+    def window(self, t_min: Optional[float] = None) -> Tuple[array, array]:
+        """Return copies of timestamps and values (from t_min onwards) as contiguous arrays."""
+        first = self.find(t_min) if t_min is not None else 0
+        if first >= self.size:
+            return (array('d'), array('d'))
+        a = self._index(first)
+        b = self._index(self.size - 1) + 1
+        if a < b:
+            return (self.t[a:b], self.v[a:b])
+        return (self.t[a:] + self.t[:b], self.v[a:] + self.v[:b])
+
+
+# eof :-)
@@ -0,0 +1,57 @@
+#
+# settings.py - Configuration file handling for FanPico Monitor
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import logging as log
+import configparser
+
+
+config_filename = os.environ.get("HOME", "") + '/.fanpico-mon.ini'
+
+config = configparser.ConfigParser(defaults={'theme': 'System'})
+
+
+def load_config():
+    if os.path.exists(config_filename):
+        log.info("Main: reading config file: " + config_filename)
+        config.read(config_filename)
+    else:
+        log.warning("Main: No config file found: " + config_filename)
+
+
+def save_config():
+    log.info("Saving config: " + config_filename)
+    with open(config_filename, 'w') as configfile:
+        config.write(configfile)
+
+
+def unit_options(name):
+    """Return FanPico connection options for an unit from the config."""
+    return {
+        'baudrate': config.get(name, 'baudrate', fallback=115200),
+        'timeout': config.getfloat(name, 'timeout', fallback=2),
+        'poll_interval': config.getfloat(name, 'poll_interval', fallback=2.0),
+        'adaptive': config.getboolean(name, 'adaptive_poll', fallback=False),
+        'fast_interval': config.getfloat(name, 'fast_poll_interval', fallback=0.25),
+        'query_plan': config.get(name, 'query_plan', fallback='') or None,
+    }
+
+
+# eof :-)
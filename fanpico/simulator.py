@@ -0,0 +1,223 @@
+#
+# simulator.py - Simulated FanPico unit for testing without hardware
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import argparse
+import logging as log
+import math
+import random
+import re
+import socket
+import socketserver
+import threading
+import time
+
+# single value queries: MEASure:<channel>:<field>?
+MEASURE_RE = re.compile(r'^MEAS(?:URE)?:(FAN|MBFAN|SENSOR)(\d+):(RPM|PWM|TEMP)\?$')
+
+# default simulation parameters (override in device string: sim://fans=8,sensors=3,...)
+DEFAULTS = {
+    'fans': 8,          # number of fan outputs
+    'mbfans': 4,        # number of motherboard fan inputs
+    'sensors': 3,       # number of temperature sensors
+    'rate': 1.0,        # waveform speed (cycles per minute)
+    'latency': 0.01,    # query response latency (seconds)
+    'jitter': 0.005,    # random extra latency (seconds)
+    'noise': 0.02,      # relative noise added to readings
+    'stall': 0.0,       # probability (per query) of a fan stalling for a few seconds
+    'seed': None,       # random seed (for repeatable runs)
+}
+
+
+def parse_options(options):
+    """Parse 'key=value,key=value' option string into dictionary of simulation parameters."""
+    res = dict(DEFAULTS)
+    for opt in options.split(','):
+        if not opt.strip():
+            continue
+        key, _, value = opt.partition('=')
+        key = key.strip().lower()
+        if key not in DEFAULTS:
+            raise ValueError(f"unknown simulator option: {key}")
+        if key in ('fans', 'mbfans', 'sensors', 'seed'):
+            res[key] = int(value)
+        else:
+            res[key] = float(value)
+    return res
+
+
+class SimDevice:
+    """
+    Simulated FanPico unit answering SCPI queries with generated readings.
+    Implements the same interface as scpi_lite.SCPIDevice (plus batch()).
+    """
+
+    pipelining = True
+
+    def __init__(self, options='', timeout=2, verbose=0):
+        self.options = parse_options(options)
+        self.timeout = timeout
+        self.verbose = verbose
+        self.random = random.Random(self.options['seed'])
+        o = self.options
+        self.manufacturer = 'TJKO Industries'
+        self.model = f"FANPICO-{o['fans']:02d}{o['mbfans']:02d}SIM"
+        self.serial = f"SIM{self.random.getrandbits(32):08x}"
+        self.firmware = '1.6.0'
+        self.phase = [self.random.uniform(0, 2 * math.pi) for _ in range(o['fans'] + o['mbfans'] + o['sensors'])]
+        self.max_rpm = [self.random.choice((1200, 1500, 2000, 3000)) for _ in range(o['fans'] + o['mbfans'])]
+        self.stalled = {}
+        self.start = time.monotonic()
+        log.debug("SimDevice: %s", self.options)
+
+    def close(self):
+        pass
+
+    def delay(self):
+        """Return simulated response latency (seconds)."""
+        return self.options['latency'] + self.random.uniform(0, self.options['jitter'])
+
+    def query(self, cmd, multi_line=False):
+        time.sleep(self.delay())
+        return self.response(cmd)
+
+    def batch(self, batch):
+        time.sleep(self.delay())
+        if batch.cmds and not batch.receive(self.output(batch.commands())):
+            raise TimeoutError('timeout waiting for response')
+        return batch.result()
+
+    def output(self, cmds):
+        """Return data sent in response to commands (unknown queries are not answered, like on a real unit)."""
+        return b''.join((r + '\n').encode() for r in map(self.response, cmds) if r)
+
+    def _wave(self, i, t):
+        return math.sin(2 * math.pi * self.options['rate'] * t / 60 + self.phase[i])
+
+    def _noise(self, value):
+        return value * (1 + self.random.gauss(0, self.options['noise']))
+
+    def _fan(self, i, t):
+        pwm = min(100.0, max(0.0, 50 + 40 * self._wave(i, t)))
+        rpm = self._noise(self.max_rpm[i] * (0.2 + 0.8 * pwm / 100))
+        if self.options['stall'] > 0 and self.random.random() < self.options['stall']:
+            self.stalled[i] = t + self.random.uniform(1, 5)
+        if self.stalled.get(i, 0) > t:
+            rpm = 0
+        return (max(0.0, rpm), rpm * 2 / 60, pwm)
+
+    def status(self, t=None):
+        """Return simulated R? response."""
+        if t is None:
+            t = time.monotonic() - self.start
+        o = self.options
+        lines = []
+        for n in range(o['fans']):
+            rpm, freq, pwm = self._fan(n, t)
+            lines.append(f'fan{n + 1},"Fan {n + 1}",{rpm:.0f},{freq:.1f},{pwm:.1f}')
+        for n in range(o['mbfans']):
+            rpm, freq, pwm = self._fan(o['fans'] + n, t)
+            lines.append(f'mbfan{n + 1},"MB Fan {n + 1}",{rpm:.0f},{freq:.1f},{pwm:.1f}')
+        for n in range(o['sensors']):
+            temp = 35 + 10 * self._wave(o['fans'] + o['mbfans'] + n, t / 4) + self.random.gauss(0, 0.1)
+            lines.append(f'sensor{n + 1},"Sensor {n + 1}",{temp:.1f}')
+        return '\n'.join(lines)
+
+    def response(self, cmd):
+        """Return response to a SCPI command (without simulated latency), empty if not answered."""
+        c = cmd.strip().upper()
+        if c == '*IDN?':
+            return f"{self.manufacturer},{self.model},{self.serial},{self.firmware}"
+        if c in ('R?', 'READ?', 'MEAS:READ?', 'MEASURE:READ?'):
+            return self.status()
+        match = MEASURE_RE.match(c)
+        if match:
+            return self.measure(match[1].lower(), int(match[2]), match[3].lower())
+        return ''
+
+    def measure(self, group, n, field, t=None):
+        """Return response to a single value query (e.g. MEAS:FAN1:RPM?)."""
+        if t is None:
+            t = time.monotonic() - self.start
+        o = self.options
+        if group == 'sensor' and field == 'temp' and 1 <= n <= o['sensors']:
+            temp = 35 + 10 * self._wave(o['fans'] + o['mbfans'] + n - 1, t / 4) + self.random.gauss(0, 0.1)
+            return f'{temp:.1f}'
+        count = o['fans'] if group == 'fan' else o['mbfans'] if group == 'mbfan' else 0
+        if field in ('rpm', 'pwm') and 1 <= n <= count:
+            rpm, _, pwm = self._fan(n - 1 if group == 'fan' else o['fans'] + n - 1, t)
+            return f'{rpm:.0f}' if field == 'rpm' else f'{pwm:.1f}'
+        return ''
+
+
+class SimRequestHandler(socketserver.StreamRequestHandler):
+    """Answer SCPI queries (one per line) from a simulated unit, one unit per connection."""
+
+    def handle(self):
+        sim = SimDevice(self.server.options)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        log.info("SimServer(%d): connection from %s", self.server.server_address[1], self.client_address)
+        for line in self.rfile:
+            cmd = line.decode(errors='replace').strip()
+            if not cmd:
+                continue
+            time.sleep(sim.delay())
+            self.wfile.write(sim.output([cmd]))
+
+
+class SimServer(socketserver.ThreadingTCPServer):
+    """TCP server for simulated unit(s) (stand-in for units reachable over network: tcp://host:port)."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, options=''):
+        parse_options(options)
+        self.options = options
+        super().__init__(address, SimRequestHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated FanPico unit(s) reachable over TCP')
+    parser.add_argument('--listen', type=int, default=5025, metavar='PORT',
+                        help='TCP port (first port, when multiple units) (default: 5025)')
+    parser.add_argument('--bind', default='127.0.0.1', help='address to bind to (default: 127.0.0.1)')
+    parser.add_argument('--count', type=int, default=1, help='number of units (on consecutive ports)')
+    parser.add_argument('--verbose', '-v', action='count', default=0, help='increase verbosity')
+    parser.add_argument('options', nargs='?', default='', help='simulator options (e.g. fans=8,latency=0.05)')
+    args = parser.parse_args()
+    log.basicConfig(format='%(asctime)s %(levelname)s %(message)s',
+                    level=log.DEBUG if args.verbose > 1 else log.INFO if args.verbose else log.WARN)
+
+    servers = [SimServer((args.bind, args.listen + i), args.options) for i in range(args.count)]
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Simulating {args.count} unit(s): tcp://{args.bind}:{args.listen}"
+          + (f" ... tcp://{args.bind}:{args.listen + args.count - 1}" if args.count > 1 else ''))
+    try:
+        servers[0].serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
+
+
+# eof :-)
@@ -0,0 +1,157 @@
+#
+# stats.py - Self-instrumentation (latency histograms) for FanPico Monitor
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import time
+from contextlib import contextmanager
+
+
+class Histogram:
+    """
+    Histogram with logarithmic (power of 2) buckets. Values are scaled to
+    integers first (default scale turns seconds into microseconds), so
+    recording a value is cheap enough to do on every poll and redraw.
+    """
+
+    def __init__(self, scale=1e6, unit='s'):
+        self.scale = scale
+        self.unit = unit
+        self.buckets = [0] * 40
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def add(self, value):
+        i = min(int(value * self.scale).bit_length(), len(self.buckets) - 1)
+        self.buckets[i] += 1
+        self.count += 1
+        self.total += value
+        self.last = value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p):
+        """Return (upper bound of the bucket containing) given percentile."""
+        if not self.count:
+            return None
+        limit = self.count * p / 100
+        n = 0
+        for i, c in enumerate(self.buckets):
+            n += c
+            if n >= limit:
+                return min(self.max, (1 << i) / self.scale)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'last': self.last,
+            'min': self.min,
+            'mean': self.mean(),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'buckets': {(1 << i) / self.scale: c for i, c in enumerate(self.buckets) if c},
+        }
+
+
+# metrics recorded per unit: (name, scale, unit, description)
+METRICS = [
+    ('query', 1e6, 's', "Poll query round trip(s)"),
+    ('response_size', 1, 'bytes', "Poll response size"),
+    ('get_status', 1e6, 's', "get_status() call"),
+    ('update', 1e6, 's', "FanPicoFrame.update"),
+    ('update_canvas', 1e6, 's', "FanPicoFrame._update_canvas"),
+    ('update_plot', 1e6, 's', "TimePlot.update_plot"),
+]
+
+# event counters recorded per unit: (name, description)
+COUNTERS = [
+    ('text_updates', "Canvas text updates"),
+    ('skipped_updates', "Unchanged canvas texts skipped"),
+]
+
+
+class UnitStats:
+    """Histograms of poll and UI timings (and event counters) of a single unit."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.histograms = {name: Histogram(scale, unit) for name, scale, unit, _ in METRICS}
+        self.counters = {name: 0 for name, _ in COUNTERS}
+
+    def add(self, name, value):
+        self.histograms[name].add(value)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histograms[name].add(time.perf_counter() - start)
+
+    def reset(self):
+        self.__init__()
+
+    def summary(self):
+        res = {name: h.summary() for name, h in self.histograms.items() if h.count}
+        res.update((name, n) for name, n in self.counters.items() if n)
+        return res
+
+    def format(self):
+        """Return statistics as list of text lines."""
+        lines = []
+        for name, _, unit, text in METRICS:
+            h = self.histograms[name]
+            if not h.count:
+                continue
+            if unit == 's':
+                values = [f'{v * 1000:9.3f}' for v in (h.last, h.mean(), h.percentile(90), h.max)]
+                unit = 'ms'
+            else:
+                values = [f'{v:9.0f}' for v in (h.last, h.mean(), h.percentile(90), h.max)]
+            lines.append(f'{text:30s} {h.count:7d} {" ".join(values)} {unit}')
+        for name, text in COUNTERS:
+            if self.counters[name]:
+                lines.append(f'{text:30s} {self.counters[name]:7d}')
+        return lines
+
+
+def format_stats(units):
+    """Return text report of statistics for dictionary of (name -> FanPico) units."""
+    lines = [f'{"":32s} {"count":>7s} {"last":>9s} {"mean":>9s} {"p90":>9s} {"max":>9s}']
+    for name, unit in sorted(units.items()):
+        lines.append(f'{name} ({unit.device}, {unit.state}):')
+        lines.extend('  ' + line for line in unit.stats.format())
+    return '\n'.join(lines)
+
+
+# eof :-)
@@ -0,0 +1,284 @@
+#
+# status.py - Parsing of FanPico status (R?) responses
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging as log
+import re
+from typing import NamedTuple, Optional
+
+
+# Readings that were not polled (see QueryPlan) are None.
+
+class FanStatus(NamedTuple):
+    """Status of a fan (or mbfan) output: 'fan1,"name",rpm,freq,pwm'"""
+    name: str
+    rpm: Optional[int]
+    freq: Optional[float]
+    pwm: Optional[float]
+
+
+class SensorStatus(NamedTuple):
+    """Status of a temperature sensor: 'sensor1,"name",temp'"""
+    name: str
+    temp: Optional[float]
+
+
+def format_value(value, spec):
+    """Format reading with given format spec ('-' if reading is not available)."""
+    if value is None:
+        return '-'.rjust(int(re.match(r'\d*', spec)[0] or 0))
+    return format(value, spec)
+
+
+def parse_line(line):
+    """Parse single line of R? response into (key, record) tuple (or None)."""
+    fields = line.strip().split(',')
+    if len(fields) < 2:
+        return None
+    key = fields[0]
+    try:
+        if key.startswith('fan') or key.startswith('mbfan'):
+            return (key, FanStatus(fields[1].strip('"'), int(float(fields[2])),
+                                   float(fields[3]), float(fields[4])))
+        if key.startswith('sensor'):
+            return (key, SensorStatus(fields[1].strip('"'), float(fields[2])))
+    except (IndexError, ValueError) as err:
+        log.debug("parse_line: invalid line '%s': %s", line, err)
+        return None
+    return None
+
+
+def parse_idn(response):
+    """Parse *IDN? response into (manufacturer, model, serial, firmware) tuple."""
+    fields = [f.strip() for f in response.strip().split(',', 3)]
+    fields += ['N/A'] * (4 - len(fields))
+    return tuple(fields)
+
+
+def parse_status(response):
+    """Parse R? response into dictionary of status records."""
+    status = {}
+    for line in response.split('\n'):
+        res = parse_line(line)
+        if res:
+            status[res[0]] = res[1]
+    return status
+
+
+# fields that can be queried separately (and default fields polled) per channel group
+PLAN_FIELDS = {
+    'fan': ('rpm', 'pwm'),
+    'mbfan': ('rpm', 'pwm'),
+    'sensor': ('temp',),
+}
+
+CHANNEL_RE = re.compile(r'^(fan|mbfan|sensor)(\d+)?$')
+
+
+class QueryPlan:
+    """
+    Poll selected fields of selected channels with single value queries
+    (e.g. 'MEAS:FAN1:RPM?') instead of reading full status with R?.
+
+    Plan is specified as comma separated list of group or channel names, each
+    optionally followed by ':field'. For example 'fan:rpm,sensor1' polls RPM of
+    all fans and temperature of sensor1. Names (and initial values of other
+    fields) are only read (with R?) when connecting to the unit. In the status
+    published from the plan, fields that were not polled are None.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.items = []
+        for item in spec.split(','):
+            item = item.strip().lower()
+            if not item:
+                continue
+            target, _, field = item.partition(':')
+            match = CHANNEL_RE.match(target)
+            if not match:
+                raise ValueError(f"invalid channel in query plan: {target}")
+            fields = PLAN_FIELDS[match[1]]
+            if field and field not in fields:
+                raise ValueError(f"invalid field in query plan: {item}")
+            self.items.append((match[1], target if match[2] else None, (field,) if field else fields))
+        if not self.items:
+            raise ValueError("empty query plan")
+        self.keys = None
+        self.cmds = []
+
+    def commands(self, status):
+        """Return list of (channel, field, command) tuples for channels present in status."""
+        keys = tuple(sorted(status))
+        if keys != self.keys:
+            self.keys = keys
+            self.cmds = []
+            for group, channel, fields in self.items:
+                for key in keys:
+                    match = CHANNEL_RE.match(key)
+                    if not match or match[1] != group or (channel and key != channel):
+                        continue
+                    for field in fields:
+                        cmd = (key, field, f"MEAS:{key.upper()}:{field.upper()}?")
+                        if cmd not in self.cmds:
+                            self.cmds.append(cmd)
+            if not self.cmds:
+                log.warning("QueryPlan: '%s' matches no channels, polling full status instead", self.spec)
+        return self.cmds
+
+    @staticmethod
+    def apply(status, responses):
+        """
+        Return status records updated from list of (channel, field, response) tuples.
+        Fields without a (valid) response are set to None, so earlier readings are
+        not published again as new samples.
+        """
+        values = {}
+        for key, field, response in responses:
+            try:
+                value = float(response)
+            except ValueError:
+                log.debug("QueryPlan: invalid response for %s.%s: '%s'", key, field, response)
+                continue
+            if field == 'rpm':
+                value = int(value)
+            values.setdefault(key, {})[field] = value
+        res = {}
+        for key, record in status.items():
+            if isinstance(record, (FanStatus, SensorStatus)):
+                fields = dict.fromkeys(record._fields[1:])
+                fields.update(values.get(key, ()))
+                res[key] = record._replace(**fields)
+        return res
+
+
+# queries with multi-line responses
+MULTI_LINE_COMMANDS = ('R?', 'READ?', 'MEAS:READ?', 'MEASURE:READ?')
+
+# query used to mark end of responses (its response is known after connecting)
+SENTINEL = '*IDN?'
+
+
+class ResponseError(OSError):
+    """Responses received do not match the queries sent (unit did not answer some query)."""
+
+
+class Batch:
+    """
+    Several queries sent back to back (pipelined) and responses split from
+    the received data. Unit stays silent on unknown (or invalid) queries, so
+    queries are sent in segments, each followed by '*IDN?' (whose response is
+    known): a run of single line queries must get exactly one line each, and
+    a multi-line query (R?) gets all lines up to the *IDN? response. This way
+    responses can not get mixed up, and there is no need to wait for the link
+    to go idle. Transports (blocking and asyncio) just send commands() and
+    pass received data to receive() until it returns True, then call result().
+    """
+
+    def __init__(self, cmds, idn=None):
+        # idn: (manufacturer, model) of the unit
+        self.cmds = list(cmds)
+        self.multi_line = [cmd.strip().upper() in MULTI_LINE_COMMANDS for cmd in self.cmds]
+        self.idn = idn
+        self.segments = []
+        run = []
+        for i, cmd in enumerate(self.cmds):
+            if cmd.strip().upper() == SENTINEL:
+                # response to *IDN? ends the segment by itself
+                self.segments.append((run + [i], False))
+                run = []
+            elif self.multi_line[i]:
+                if run:
+                    self.segments.append((run, True))
+                    run = []
+                self.segments.append(([i], True))
+            else:
+                run.append(i)
+        if run:
+            self.segments.append((run, True))
+        if not idn and any(sentinel for _, sentinel in self.segments):
+            # (before connecting only *IDN? itself can be queried)
+            raise ValueError("unit identity needed for batching queries")
+        self.responses = [None] * len(self.cmds)
+        self.segment = 0
+        self.lines = []
+        self.error = None
+        self.buffer = bytearray()
+
+    def commands(self):
+        """Return commands to send."""
+        res = []
+        for indexes, sentinel in self.segments:
+            res.extend(self.cmds[i] for i in indexes)
+            if sentinel:
+                res.append(SENTINEL)
+        return res
+
+    def done(self):
+        return self.segment == len(self.segments)
+
+    def receive(self, data):
+        """Process received data. Returns True once all responses have been received."""
+        buffer = self.buffer
+        buffer += data
+        while not self.done():
+            i = buffer.find(b'\n')
+            if i < 0:
+                break
+            line = bytes(buffer[:i]).decode(errors='replace').rstrip('\r')
+            del buffer[:i + 1]
+            self.feed(line)
+        return self.done()
+
+    def feed(self, line):
+        """Process received line. Returns True once all responses have been received."""
+        if not line:
+            return self.done()
+        if not self.idn or parse_idn(line)[:2] == self.idn:
+            self._end_segment(line)
+        else:
+            self.lines.append(line)
+        return self.done()
+
+    def _end_segment(self, idn_line):
+        indexes, sentinel = self.segments[self.segment]
+        self.segment += 1
+        lines = self.lines
+        self.lines = []
+        if not sentinel:
+            # segment ends with *IDN? query
+            self.responses[indexes[-1]] = idn_line
+            indexes = indexes[:-1]
+        if len(indexes) == 1 and self.multi_line[indexes[0]]:
+            self.responses[indexes[0]] = '\n'.join(lines)
+        elif len(lines) == len(indexes):
+            for i, line in zip(indexes, lines):
+                self.responses[i] = line
+        elif not self.error:
+            self.error = ResponseError(f"got {len(lines)} responses to {len(indexes)} queries: "
+                                       + ', '.join(self.cmds[i] for i in indexes))
+
+    def result(self):
+        """Return list of responses (in same order as the queries)."""
+        if self.error:
+            raise self.error
+        return self.responses
+
+
+# eof :-)
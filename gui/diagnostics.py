@@ -0,0 +1,87 @@
+#
+# diagnostics.py - Window displaying FanPico Monitor self-instrumentation
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging as log
+import customtkinter as ctk
+from fanpico.stats import format_stats
+
+
+class DiagnosticsWindow(ctk.CTkToplevel):
+    """Window showing poll latency and UI update timings of the open units (refreshed periodically)."""
+
+    refresh_interval = 1000
+
+    def __init__(self, master, *args, **kwargs):
+        super().__init__(master, *args, **kwargs)
+
+        self.title('FanPico Monitor Diagnostics')
+        win_x = master.winfo_x() + 50
+        win_y = master.winfo_y() + 50
+        self.geometry(f"760x400+{win_x}+{win_y}")
+        self.lift()
+        self.protocol("WM_DELETE_WINDOW", self._on_closing)
+
+        self.text = ctk.CTkTextbox(self, font=ctk.CTkFont(family='Courier', size=12), wrap='none')
+        self.button_frame = ctk.CTkFrame(self, fg_color='transparent')
+        self.reset_button = ctk.CTkButton(self.button_frame, text='Reset', width=80, command=self._reset)
+        self.dump_button = ctk.CTkButton(self.button_frame, text='Dump', width=80, command=master.dump_stats)
+
+        self.text.grid(row=0, column=0, padx=5, pady=5, sticky="nwse")
+        self.button_frame.grid(row=1, column=0, padx=5, pady=5, sticky="e")
+        self.reset_button.grid(row=0, column=0, padx=5)
+        self.dump_button.grid(row=0, column=1, padx=5)
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.refresh_job = None
+        self._refresh()
+        log.debug("DiagnosticsWindow: window created")
+
+    def units(self):
+        return {name: conn.dev for name, conn in self.master.connections.items()}
+
+    def _reset(self):
+        for unit in self.units().values():
+            unit.stats.reset()
+        self._refresh()
+
+    def _refresh(self):
+        if self.refresh_job:
+            self.after_cancel(self.refresh_job)
+        self.text.configure(state='normal')
+        self.text.delete('1.0', 'end')
+        self.text.insert('1.0', format_stats(self.units()))
+        self.text.configure(state='disabled')
+        self.refresh_job = self.after(self.refresh_interval, self._refresh)
+
+    def show(self):
+        self.deiconify()
+        self.lift()
+        self._refresh()
+
+    def _on_closing(self):
+        log.info("DiagnosticsWindow: window withdrawn")
+        if self.refresh_job:
+            self.after_cancel(self.refresh_job)
+            self.refresh_job = None
+        self.withdraw()
+
+
+# eof :-)
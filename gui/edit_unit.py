@@ -19,9 +19,9 @@
 #
 
 import logging as log
-import serial.tools.list_ports
 import tkinter as tk
 import customtkinter as ctk
+from fanpico.serial_ports import port_scanner
 from .ctk_dialog import CTkDialog
 
 
@@ -40,15 +40,11 @@ class EditUnitWindow(ctk.CTkToplevel):
         win_y = master.winfo_y() + 100
         self.geometry(f"+{win_x}+{win_y}")
 
-        serial_ports = []
-        for s_port in serial.tools.list_ports.comports():
-            port = s_port.name
-            if port.startswith("COM"):
-                serial_ports.append(port + ':')
-            elif port.startswith("/"):
-                serial_ports.append(port)
-            else:
-                serial_ports.append("/dev/" + port)
+        # list of serial ports comes from background scanner (filled in once available)
+        serial_ports = port_scanner.get() or []
+        port_scanner.refresh()
+        self.ports_version = port_scanner.version if port_scanner.ports is not None else None
+        self.ports_job = None
 
         self.result = {'changed': [], 'values': {}}
         self.orig_name = name
@@ -56,7 +52,7 @@ class EditUnitWindow(ctk.CTkToplevel):
         self.orig_speed = speed
         self.unit_name = tk.StringVar(value=name)
         self.speed = tk.StringVar(value=speed)
-        if device:
+        if device or not serial_ports:
             self.device = tk.StringVar(value=device)
         else:
             self.device = tk.StringVar(value=serial_ports[0])
@@ -99,8 +95,25 @@ class EditUnitWindow(ctk.CTkToplevel):
         self._speed.grid(row=3, column=1, padx=5, pady=(1, 5), sticky="w")
         self._button_frame.grid(row=4, column=0, columnspan=2)
         self.after(150, lambda: self._entry.focus())
+        self._update_ports()
         log.debug("EditUnitWindow : created")
 
+    def _update_ports(self):
+        ports = port_scanner.get()
+        if ports is not None and port_scanner.version != self.ports_version:
+            log.debug("EditUnitWindow : serial ports: %s", ports)
+            self.ports_version = port_scanner.version
+            self._device.configure(values=ports)
+            if not self.device.get() and ports:
+                self.device.set(ports[0])
+        self.ports_job = self.after(250, self._update_ports)
+
+    def destroy(self):
+        if self.ports_job:
+            self.after_cancel(self.ports_job)
+            self.ports_job = None
+        super().destroy()
+
     def _ok_event(self):
         log.info("EditUnitWindow : ok pressed")
         changed = []
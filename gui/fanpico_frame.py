@@ -0,0 +1,167 @@
+#
+# fanpico_frame.py - Frame displaying status of a FanPico unit
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging as log
+import re
+import tkinter as tk
+import customtkinter as ctk
+from fanpico.device import timestamp
+from fanpico.status import format_value
+from .time_plot import TimePlot
+
+
+class FanPicoFrame(ctk.CTkFrame):
+    """
+    Status of a FanPico unit. Connection (dev) and history are owned by
+    MonitorApp, which calls update() when new status is available.
+    """
+
+    def __init__(self, master, name, dev, history, t_range=60, envelope=False, use_numpy=False):
+        super().__init__(master)
+
+        self.dev = dev
+        self.name = name
+        self.label_font = ctk.CTkFont(family='Helvetica', size=14, weight="bold")
+        self.text_font = ctk.CTkFont(family='Courier', size=13, weight="bold")
+        self.small_font = ctk.CTkFont(family='Helvetica', size=10)
+
+        self.model = tk.StringVar(value=self._model_text())
+
+        self.model_label = ctk.CTkLabel(self, textvariable=self.model)
+        self.w = 510
+        self.h = 460
+        self.cn = tk.Canvas(self, width=self.w, height=self.h, bg='gray50', borderwidth=-3, relief="flat")
+
+        self.columnconfigure(0, weight=1)
+        self.model_label.grid(row=0, column=0, padx=5, pady=(0, 0), sticky="w")
+        self.cn.grid(row=1, column=0, padx=5, pady=(0, 10), sticky="we")
+
+        self.ci = {}
+        self.rendered = {}
+        self.skipped_updates = 0
+        self.initialized = 0
+        self.t_range = t_range
+        self.history = history
+        self.envelope = '#1f8a5c' if envelope else None
+        self.use_numpy = use_numpy
+        self.tstamp = None
+        self.status = None
+
+        self.after_idle(self.update)
+
+    def destroy(self):
+        log.info('FanPicoFrame:destroy %s', self.name)
+        super().destroy()
+
+    def _model_text(self):
+        text = str(self.name + ': ' + self.dev.model + ' v' + self.dev.firmware + ' [' + self.dev.serial + ']')
+        if not self.dev.connected():
+            text += ' (' + self.dev.state + ')'
+        return text
+
+    def update(self):
+        log.debug('FanPicoFrame:update %s', self.name)
+        with self.dev.stats.timer('update'):
+            model = self._model_text()
+            if model != self.model.get():
+                self.model.set(model)
+            self.status = self.dev.get_status()
+            if 'last_update' in self.status:
+                if not self.initialized:
+                    self._populate_canvas()
+                with self.dev.stats.timer('update_canvas'):
+                    self._update_canvas()
+
+    def _populate_canvas(self):
+        spacing = 30
+        self.initialized = 1
+        if log.getLogger().isEnabledFor(log.DEBUG):
+            self.tstamp = self.cn.create_text(5, self.h - 10 , text='', font=self.small_font, fill='black', anchor="nw")
+        count = 0
+        for k, v in sorted(self.status.items()):
+            #log.info("item='%s': %s", k, v)
+            match = re.search(r"^(\S+)(\d+)$", k)
+            if match:
+                group = match[1]
+                # num = int(match[2])
+                line = count * spacing + 10
+                count += 1
+                if group == "fan" or group == "mbfan":
+                    self.ci.setdefault(group, {}).setdefault(k, {})['label'] = self.cn.create_text(5,
+                                                    line, text=k, font=self.small_font, fill='gray30', anchor="nw")
+                    self.ci.setdefault(group, {}).setdefault(k, {})['name'] = self.cn.create_text(50,
+                                                    line, text=v.name, font=self.label_font, fill='black', anchor="nw")
+                    self.ci.setdefault(group, {}).setdefault(k, {})['pwm'] = self.cn.create_text(200, line + 3, text="",
+                                                                                font=self.text_font, fill='black', anchor="nw")
+                    self.ci.setdefault(group, {}).setdefault(k, {})['rpm'] = self.cn.create_text(250, line + 3, text="",
+                                                                     font=self.text_font, fill='black', anchor="nw")
+                    p = TimePlot(self.cn, self.history.series(k), width=150, height=spacing-5, bd=-3, bg='gray50', color='#2cc985',
+                                 envelope=self.envelope, t_range=self.t_range, use_numpy=self.use_numpy)
+                    self.ci[group][k]['plot'] = self.cn.create_window(350, line-7, anchor="nw", window=p, width=150, height=spacing-5)
+                    self.ci[group][k]['plot_obj'] = p
+                if group == "sensor":
+                    self.ci.setdefault(group, {}).setdefault(k, {})['label'] = self.cn.create_text(5, line, text=k,
+                                                                     font=self.small_font, fill='gray30', anchor="nw")
+                    self.ci.setdefault(group, {}).setdefault(k, {})['name'] = self.cn.create_text(50, line, text=v.name,
+                                                                     font=self.label_font, fill='black', anchor="nw")
+                    self.ci.setdefault(group, {}).setdefault(k, {})['temp'] = self.cn.create_text(250, line + 3, text="",
+                                                                     font=self.text_font, fill='black', anchor="nw")
+                    p = TimePlot(self.cn, self.history.series(k), width=151, height=spacing-5, bd=-3, bg='gray50', color='#2cc985',
+                                 envelope=self.envelope, t_range=self.t_range, use_numpy=self.use_numpy)
+                    self.ci[group][k]['plot'] = self.cn.create_window(350, line-7, anchor="nw", window=p, width=150, height=spacing-5)
+                    self.ci[group][k]['plot_obj'] = p
+                self.cn.create_line(5, line+20, self.w-5, line+20, fill='gray40')
+
+    def _set_text(self, item, text):
+        """Update canvas text item, skipping the Tk call if text has not changed."""
+        if self.rendered.get(item) == text:
+            self.skipped_updates += 1
+            self.dev.stats.count('skipped_updates')
+            return
+        self.rendered[item] = text
+        self.dev.stats.count('text_updates')
+        self.cn.itemconfigure(item, text=text)
+
+    def _update_canvas(self):
+        t = timestamp()
+        stats = self.dev.stats
+        log.debug("update canvas %s (skipped updates: %d)", self.name, self.skipped_updates)
+        if self.tstamp:
+            self._set_text(self.tstamp, f"{self.status['last_update']:.3f} #{self.status['seq']}")
+        for fan in self.ci.get('fan', {}):
+            v = self.status[fan]
+            self._set_text(self.ci['fan'][fan]['pwm'], format_value(v.pwm, '3.0f') + " %")
+            self._set_text(self.ci['fan'][fan]['rpm'], format_value(v.rpm, '6d') + " rpm")
+            with stats.timer('update_plot'):
+                self.ci['fan'][fan]['plot_obj'].update_plot(t)
+        for mbfan in self.ci.get('mbfan', {}):
+            v = self.status[mbfan]
+            self._set_text(self.ci['mbfan'][mbfan]['pwm'], format_value(v.pwm, '3.0f') + " %")
+            self._set_text(self.ci['mbfan'][mbfan]['rpm'], format_value(v.rpm, '6d') + " rpm")
+            with stats.timer('update_plot'):
+                self.ci['mbfan'][mbfan]['plot_obj'].update_plot(t)
+        for sensor in self.ci.get('sensor', {}):
+            v = self.status[sensor]
+            self._set_text(self.ci['sensor'][sensor]['temp'], format_value(v.temp, '6.2f') + " C")
+            with stats.timer('update_plot'):
+                self.ci['sensor'][sensor]['plot_obj'].update_plot(t)
+
+
+# eof :-)
@@ -0,0 +1,59 @@
+#
+# icons.py - Lazily loaded light/dark icon images for FanPico Monitor
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import logging as log
+import customtkinter as ctk
+
+
+class IconSet:
+    """
+    Icons with light and dark variants (assets/<name>_light.png, assets/<name>_dark.png).
+    At first only the variant for current appearance mode is loaded (and used for both
+    modes), the other variant is loaded when load_deferred() is called.
+    """
+
+    def __init__(self, asset_path):
+        self.asset_path = asset_path
+        self.pending = []
+
+    def _open(self, filename):
+        from PIL import Image
+        return Image.open(os.path.join(self.asset_path, filename))
+
+    def image(self, filename, size):
+        """Return CTkImage of a single (mode independent) image."""
+        return ctk.CTkImage(self._open(filename), size=size)
+
+    def icon(self, name, size=(20, 20)):
+        mode = 'dark' if ctk.get_appearance_mode() == 'Dark' else 'light'
+        image = self._open(f'{name}_{mode}.png')
+        icon = ctk.CTkImage(light_image=image, dark_image=image, size=size)
+        self.pending.append((icon, name, 'light' if mode == 'dark' else 'dark'))
+        return icon
+
+    def load_deferred(self):
+        for icon, name, mode in self.pending:
+            icon.configure(**{mode + '_image': self._open(f'{name}_{mode}.png')})
+        log.debug("IconSet: loaded %d deferred icons", len(self.pending))
+        self.pending = []
+
+
+# eof :-)
@@ -0,0 +1,408 @@
+#
+# monitor_app.py - Main window of FanPico Monitor
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import sys
+import time
+import queue
+from typing import NamedTuple
+import logging as log
+import tkinter as tk
+import customtkinter as ctk
+from fanpico.device import FanPico
+from fanpico.history import UnitHistory
+from fanpico.settings import config, save_config, unit_options
+from fanpico.stats import format_stats
+from fanpico.serial_ports import port_scanner
+from .ctk_dialog import CTkDialog
+from .fanpico_frame import FanPicoFrame
+from .icons import IconSet
+from .overview import OverviewCanvas
+
+
+class UnitConnection(NamedTuple):
+    """Connection and sample history of a unit, shared by the unit frame and the overview."""
+    dev: FanPico
+    history: UnitHistory
+    t_range: int
+
+
+class MonitorApp(ctk.CTk):
+    w = 800
+    h = 600
+    program_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+    def __init__(self, program_version, poll_engine=None, exporter=None, start_time=None, exit_on_startup=False,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.program_version = program_version
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+        self.exit_on_startup = exit_on_startup
+        self.startup_times = {}
+        self.poll_engine = poll_engine
+        self.exporter = exporter
+
+        self.geometry(f"{self.w}x{self.h}")
+        self.title("FanPico Monitor")
+
+        log.info("Screen size: %dx%d", self.winfo_screenwidth(), self.winfo_screenheight())
+
+        asset_path = "./assets"
+        self.about_window = None
+        self.diagnostics_window = None
+        self.devices = {}
+        self.connections = {}
+        self.status_queue = queue.SimpleQueue()
+        self.overview = None
+        self.menubar = tk.Menu(self)
+        self.config(menu=self.menubar)
+
+        #self.help_menu = tk.Menu(self.menubar, tearoff=0)
+        #self.help_menu.add_command(label='Help')
+        #self.help_menu.add_command(label='About...', command=self._about_menu)
+        #self.menubar.add_cascade(label='Help', menu=self.help_menu)
+
+        # only icons for current appearance mode are loaded here, rest once window is shown
+        self.icons = IconSet(asset_path)
+        self.app_logo = self.icons.image("fanpico-logo-color.png", size=(64, 64))
+        self.add_icon_image = self.icons.icon("plus-circle")
+        self.del_icon_image = self.icons.icon("trash")
+        self.edit_icon_image = self.icons.icon("settings")
+        self.power_icon_image = self.icons.icon("power")
+        self.info_icon_image = self.icons.icon("info")
+
+        self.app_logo = ctk.CTkLabel(self, text='FanPico Monitor',
+                                     font=ctk.CTkFont(size=15, weight='bold'),
+                                     image=self.app_logo,
+                                     compound='left')
+
+        # frame for list of units...
+        self.unit_frame = ctk.CTkFrame(self)
+        self.add_button = ctk.CTkButton(self.unit_frame, text="", width=30,
+                                        fg_color='transparent',
+                                        command=self.__add_unit,
+                                        image=self.add_icon_image)
+        self.edit_button = ctk.CTkButton(self.unit_frame, text="", width=30,
+                                        fg_color='transparent',
+                                         command=self.__edit_unit,
+                                         image=self.edit_icon_image)
+        self.del_button = ctk.CTkButton(self.unit_frame, text="", width=30,
+                                        fg_color='transparent',
+                                        command=self.__del_unit,
+                                        image=self.del_icon_image)
+        self.unitnames = tk.StringVar(value=config.sections())
+        self.unit_list = tk.Listbox(self.unit_frame,
+                                    listvariable=self.unitnames,
+                                    height=5, selectmode='browse',
+                                    bd=0, selectborderwidth=0,
+                                    activestyle='none', relief='flat',
+                                    bg='Gray50', selectbackground='#2CC985',
+                                    font=ctk.CTkFont(size=15, slant='roman'))
+        self.unit_list.selection_set(0)
+        self.unit_list.bind('<<ListboxSelect>>', self.__unit_select)
+        self.add_button.grid(row=1, column=0, padx=5, pady=5)
+        self.edit_button.grid(row=1, column=1, padx=5, pady=5)
+        self.del_button.grid(row=1, column=2, padx=5, pady=5)
+        self.unit_list.grid(row=0, column=0, columnspan=3, padx=10, pady=10)
+        self.overview_button = ctk.CTkButton(self.unit_frame, text="Overview", width=120,
+                                             command=self.toggle_overview)
+        self.overview_button.grid(row=2, column=0, columnspan=3, padx=5, pady=(0, 10))
+
+        self.button_frame = ctk.CTkFrame(self, fg_color='transparent')
+        self.exit_button = ctk.CTkButton(self.button_frame, text="", width=30,
+                                         image=self.power_icon_image,
+                                         fg_color='transparent',
+                                         command=self.exit_event)
+
+        self.info_button = ctk.CTkButton(self.button_frame, text="", width=30,
+                                         image=self.info_icon_image,
+                                         fg_color='transparent',
+                                         command=self._about_menu)
+
+        self.appearance_mode_menu = ctk.CTkOptionMenu(self.button_frame, values=["Light", "Dark", "System"],
+                                                      command=self.change_appearance_mode_event)
+        self.appearance_mode_menu.set(config.get("DEFAULT", "theme"))
+        self.exit_button.grid(row=0,column=2,padx=1,pady=10)
+        self.info_button.grid(row=0,column=1,padx=1,pady=10)
+        self.appearance_mode_menu.grid(row=0,column=0,padx=10,pady=10)
+
+        self.main_frame = ctk.CTkFrame(self)
+        self.main_frame_label = ctk.CTkLabel(self, text='Test')
+
+        self.columnconfigure(1, weight=1)
+        self.rowconfigure(3, weight=1)
+        self.app_logo.grid(row=0, column=0, padx=10, pady=10)
+        self.main_frame.grid(row=0, column=1, rowspan=5, padx=(0, 10), pady=(10, 10), sticky="nwse")
+        self.unit_frame.grid(row=1, column=0, padx=10, pady=5)
+        #self.appearance_mode_menu.grid(row=4, column=0, padx=10, pady=10, sticky="sw")
+        #self.info_button.grid(row=3, column=0, padx=20, pady=10, sticky="se")
+        #self.exit_button.grid(row=3, column=1, padx=20, pady=10, sticky="se")
+        self.button_frame.grid(row=4, column=0, padx=5, pady=10, sticky='sw')
+
+        self.bind('<Map>', self._map_event)
+        self.bind('<<UnitStatus>>', self._unit_status_event)
+        self.bind('<Control-d>', self._diagnostics_menu)
+        self.bind('<Control-o>', self.toggle_overview)
+        self.bind('<F12>', self.dump_stats)
+
+        self.after(100, self.unit_list.focus)
+        self.after(1000, self.__unit_select)
+
+    def _map_event(self, event):
+        # toplevel bindings see events of all child widgets too
+        if event.widget is not self or 'window' in self.startup_times:
+            return
+        self.startup_times['window'] = time.perf_counter() - self.start_time
+        log.info("MonitorApp: window shown in %.3fs", self.startup_times['window'])
+        self.after_idle(self._deferred_startup)
+
+    def _deferred_startup(self):
+        asset_path = self.icons.asset_path
+        self.wm_iconbitmap(os.path.join(asset_path, "fanpico.ico"))
+        self.iconphoto(True, tk.PhotoImage(file=os.path.join(asset_path, "fanpico-logo-color.png")))
+        self.icons.load_deferred()
+        # enumerate serial ports in background, so add/edit unit dialog opens without delay
+        port_scanner.start()
+        if self.exporter:
+            # export all units (not just the ones opened)
+            self.connect_all()
+        self.startup_times['complete'] = time.perf_counter() - self.start_time
+        log.info("MonitorApp: startup completed in %.3fs", self.startup_times['complete'])
+        if self.exit_on_startup:
+            print(f"startup time: window shown {self.startup_times['window']:.3f}s, "
+                  f"completed {self.startup_times['complete']:.3f}s")
+            self.after_idle(self.destroy)
+
+    def exit_event(self):
+        log.info("exit_event")
+        self.destroy()
+
+    def destroy(self):
+        for name in list(self.connections):
+            self.disconnect(name)
+        super().destroy()
+
+    def change_appearance_mode_event(self, new_appearance_mode):
+        ctk.set_appearance_mode(new_appearance_mode)
+
+    def connect(self, name):
+        """Return connection to a unit (opening it if not open already)."""
+        if name not in self.connections:
+            log.info("Connecting to device: %s", name)
+            t_range = config.getint(name, 'plot_range', fallback=60)
+            dev = FanPico(config.get(name, 'device', fallback=''), engine=self.poll_engine,
+                          verbose=0, **unit_options(name))
+            # room for up to 4 samples/sec over the plot window (longer ranges are plotted from rollups)
+            history = UnitHistory(name, capacity=min(t_range, 1800) * 4,
+                                  log_dir=config.get(name, 'history_dir', fallback='') or None)
+            self.connections[name] = UnitConnection(dev, history, t_range)
+            dev.add_listener(lambda dev, name=name: self._status_notify(name))
+            if self.exporter:
+                self.exporter.add_unit(name, dev)
+        return self.connections[name]
+
+    def connect_all(self):
+        """Open connections to all configured units."""
+        for name in config.sections():
+            if config.get(name, 'device', fallback=''):
+                self.connect(name)
+
+    def disconnect(self, name):
+        if self.exporter:
+            self.exporter.remove_unit(name)
+        if name in self.devices:
+            self.devices.pop(name).destroy()
+        conn = self.connections.pop(name, None)
+        if conn:
+            conn.dev.close()
+            conn.history.close()
+
+    def _status_notify(self, name):
+        # Called from poller thread: hand over to Tk main loop via virtual event.
+        self.status_queue.put(name)
+        try:
+            self.event_generate('<<UnitStatus>>', when='tail')
+        except (RuntimeError, tk.TclError) as err:
+            log.debug('MonitorApp:_status_notify %s: %s', name, err)
+
+    def _unit_status_event(self, event):
+        # keep history of all open units up to date (also those not currently displayed)
+        names = set()
+        while not self.status_queue.empty():
+            names.add(self.status_queue.get())
+        for name in names:
+            conn = self.connections.get(name)
+            if conn:
+                status = conn.dev.get_status()
+                if 'last_update' in status:
+                    conn.history.add(status, conn.t_range)
+                if name in self.devices:
+                    self.devices[name].update()
+
+    def toggle_overview(self, event=None):
+        if self.overview and self.overview.winfo_ismapped():
+            self.show_units()
+            return
+        log.debug("show overview")
+        self.connect_all()
+        for frame in self.devices.values():
+            frame.pack_forget()
+        if not self.overview:
+            self.overview = OverviewCanvas(self.main_frame, self.connections, select_callback=self._overview_select)
+        self.overview.pack(padx=10, pady=10, side="top", fill="both", expand=True)
+        self.overview.start()
+        self.overview_button.configure(text="Unit View")
+
+    def show_units(self):
+        if not self.overview or not self.overview.winfo_ismapped():
+            return
+        log.debug("show unit view")
+        self.overview.stop()
+        self.overview.pack_forget()
+        self.overview_button.configure(text="Overview")
+        for frame in self.devices.values():
+            frame.pack(padx=10, pady=10, side="top", fill="x")
+
+    def _overview_select(self, name):
+        units = config.sections()
+        if name in units:
+            self.unit_list.selection_clear(0, tk.END)
+            self.unit_list.selection_set(units.index(name))
+            self.select_unit(units.index(name))
+
+    def select_unit(self, unit):
+        units = config.sections()
+        name = units[unit]
+        log.debug("unit=%d, name='%s'", unit, name)
+        self.show_units()
+        if not name in self.devices:
+            conn = self.connect(name)
+            self.devices[name] = FanPicoFrame(self.main_frame, name, conn.dev, conn.history, t_range=conn.t_range,
+                                                envelope=config.getboolean(name, 'plot_envelope', fallback=False),
+                                                use_numpy=config.getboolean(name, 'plot_numpy', fallback=False))
+            self.devices[name].pack(padx=10, pady=10, side="top", fill="x")
+
+    def __unit_select(self, event=None):
+        if self.unit_list.curselection():
+            unit = self.unit_list.curselection()[0]
+            log.debug("select unit: %d", unit)
+            self.select_unit(unit)
+
+    def __add_unit(self):
+        log.debug("add unit")
+        l = 1 + len(list(config.sections()))
+        while True:
+            name = f"fanpico{l}"
+            if not config.has_section(name):
+                break
+            l += 1
+        from .edit_unit import EditUnitWindow
+        res = EditUnitWindow(self, name, '', '115200').dialog()
+        log.info(res)
+        if len(res['values']) < 1:
+            return
+
+        name = res['values']['name']
+        if config.has_section(name):
+            log.debug("duplicate unit name: %s", name)
+            CTkDialog(self, relative_position=(50, 50),
+                      title='Duplicate unit name',
+                      text='Unit with same name already existing unit: ' + res['values']['name'],
+                      show_cancel_button=False).get_input()
+        else:
+            log.debug("add unit: %s", name)
+            config[name] = res['values']
+            units = config.sections()
+            self.unitnames.set(units)
+            self.unit_list.selection_clear(0, tk.END)
+            self.unit_list.selection_set(0)
+            self.unit_list.activate(0)
+            save_config()
+            if self.exporter and config.get(name, 'device', fallback=''):
+                self.connect(name)
+
+    def __edit_unit(self):
+        if self.unit_list.curselection():
+            unit = self.unit_list.curselection()[0]
+            units = config.sections()
+            log.debug("edit unit: %d", unit)
+            name = units[unit]
+            from .edit_unit import EditUnitWindow
+            res = EditUnitWindow(self, name, config.get(name, 'device', fallback=''),
+                                 config.get(name, 'speed', fallback='115200')).dialog()
+            if len(res['changed']) > 0:
+                log.debug("save changes to unit")
+                if 'name' in res['changed']:
+                    log.debug("rename unit")
+                    if config.has_section(res['values']['name']):
+                        CTkDialog(self, relative_position=(50, 50),
+                                  title='Duplicate unit name',
+                                  text='Cannot rename unit over existing unit: ' + res['values']['name'],
+                                  show_cancel_button=False).get_input()
+                        return
+                    else:
+                        # rename config section
+                        config.remove_section(name)
+                        name = res['values']['name']
+                config[name] = res['values']
+                units = config.sections()
+                self.unitnames.set(units)
+                save_config()
+
+    def __del_unit(self):
+        if self.unit_list.curselection():
+            unit = self.unit_list.curselection()[0]
+            units = config.sections()
+            unit_name = units[unit]
+            if CTkDialog(self, relative_position=(50, 75),
+                         title='Remove unit?',
+                         text='Remove ' + unit_name + '?').get_input():
+                log.debug("delete unit: %d (%s) ", unit, unit_name)
+                self.disconnect(unit_name)
+                config.remove_section(unit_name)
+                units = config.sections()
+                self.unitnames.set(units)
+                self.unit_list.selection_clear(0, tk.END)
+                self.unit_list.selection_set(0)
+                self.unit_list.activate(0)
+                save_config()
+
+    def _about_menu(self):
+        log.debug('display about window')
+        if self.about_window:
+            self.about_window.deiconify()
+        else:
+            from .about import AboutWindow
+            self.about_window = AboutWindow(self, self.program_version)
+
+    def _diagnostics_menu(self, event=None):
+        log.debug('display diagnostics window')
+        if self.diagnostics_window:
+            self.diagnostics_window.show()
+        else:
+            from .diagnostics import DiagnosticsWindow
+            self.diagnostics_window = DiagnosticsWindow(self)
+
+    def dump_stats(self, event=None):
+        print(format_stats({name: conn.dev for name, conn in self.connections.items()}), file=sys.stderr)
+
+
+# eof :-)
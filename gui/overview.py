@@ -0,0 +1,231 @@
+#
+# overview.py - Compact overview of all FanPico units on a single canvas
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import logging as log
+import tkinter as tk
+import customtkinter as ctk
+from fanpico.device import timestamp
+from fanpico.status import FanStatus, SensorStatus, format_value
+
+
+class OverviewCanvas(ctk.CTkFrame):
+    """
+    All units (one header row per unit, one row per channel) drawn as items on
+    a single canvas. Rows are virtualized: canvas items exist only for the
+    rows currently visible, and are reused for other rows when scrolling.
+    """
+
+    row_height = 22
+    spark_x = 330
+    spark_width = 150
+    t_range = 300
+
+    def __init__(self, master, units, refresh_interval=1000, select_callback=None):
+        super().__init__(master)
+
+        self.units = units
+        self.refresh_interval = refresh_interval
+        self.select_callback = select_callback
+        self.label_font = ctk.CTkFont(family='Helvetica', size=12, weight="bold")
+        self.unit_font = ctk.CTkFont(family='Helvetica', size=14, weight="bold")
+        self.text_font = ctk.CTkFont(family='Courier', size=12, weight="bold")
+        self.small_font = ctk.CTkFont(family='Helvetica', size=10)
+
+        self.cn = tk.Canvas(self, bg='gray50', borderwidth=-3, relief="flat", highlightthickness=0,
+                            yscrollincrement=self.row_height)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._scroll)
+        self.cn.configure(yscrollcommand=self.scrollbar.set)
+        self.cn.grid(row=0, column=0, sticky="nwse")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.rows = []
+        self.signature = None
+        self.slots = {}
+        self.free_slots = []
+        self.refresh_job = None
+
+        self.cn.bind('<Configure>', lambda event: self._layout())
+        self.cn.bind('<MouseWheel>', self._wheel_event)
+        self.cn.bind('<Button-4>', self._wheel_event)
+        self.cn.bind('<Button-5>', self._wheel_event)
+        self.cn.bind('<Double-Button-1>', self._double_click_event)
+
+    def start(self):
+        if not self.refresh_job:
+            self.refresh()
+
+    def stop(self):
+        if self.refresh_job:
+            self.after_cancel(self.refresh_job)
+            self.refresh_job = None
+
+    def destroy(self):
+        self.stop()
+        super().destroy()
+
+    def _build_rows(self):
+        """Return list of rows: (unit name, channel) where channel is None for unit header rows."""
+        rows = []
+        for name, unit in self.units.items():
+            rows.append((name, None))
+            rows.extend((name, k) for k, v in sorted(unit.dev.get_status().items())
+                        if isinstance(v, (FanStatus, SensorStatus)))
+        return rows
+
+    def _scroll(self, *args):
+        self.cn.yview(*args)
+        self._layout()
+
+    def _wheel_event(self, event):
+        if event.num == 4 or event.delta > 0:
+            self._scroll('scroll', -1, 'units')
+        else:
+            self._scroll('scroll', 1, 'units')
+
+    def _double_click_event(self, event):
+        row = int(self.cn.canvasy(event.y) // self.row_height)
+        if self.select_callback and 0 <= row < len(self.rows):
+            self.select_callback(self.rows[row][0])
+
+    def _visible_rows(self):
+        top = self.cn.canvasy(0)
+        bottom = self.cn.canvasy(self.cn.winfo_height())
+        first = max(0, int(top // self.row_height))
+        last = min(len(self.rows), int(bottom // self.row_height) + 1)
+        return range(first, last)
+
+    def _new_slot(self):
+        if self.free_slots:
+            return self.free_slots.pop()
+        slot = {
+            'label': self.cn.create_text(5, 0, text='', font=self.small_font, fill='gray30', anchor="w"),
+            'name': self.cn.create_text(50, 0, text='', font=self.label_font, fill='black', anchor="w"),
+            'value': self.cn.create_text(170, 0, text='', font=self.text_font, fill='black', anchor="w"),
+            'spark': self.cn.create_line(0, 0, 0, 0, fill='#2cc985', width=1),
+            'line': self.cn.create_line(5, 0, 5, 0, fill='gray40'),
+            'row': None,
+            'rendered': {},
+        }
+        return slot
+
+    def _hide_slot(self, slot):
+        for item in ('label', 'name', 'value', 'spark', 'line'):
+            self.cn.itemconfigure(slot[item], state='hidden')
+        slot['row'] = None
+        slot['rendered'] = {}
+        self.free_slots.append(slot)
+
+    def _assign_slot(self, slot, i):
+        """Move slot items to row i."""
+        y = i * self.row_height + self.row_height / 2
+        y_line = (i + 1) * self.row_height - 1
+        w = max(self.cn.winfo_width(), self.spark_x + self.spark_width + 10)
+        name, channel = self.rows[i]
+        header = channel is None
+        self.cn.coords(slot['label'], 5, y)
+        self.cn.coords(slot['name'], 5 if header else 50, y)
+        self.cn.coords(slot['value'], self.spark_x if header else 170, y)
+        self.cn.coords(slot['line'], 5, y_line, w - 5, y_line)
+        self.cn.itemconfigure(slot['label'], text='' if header else channel, state='normal')
+        self.cn.itemconfigure(slot['name'], font=self.unit_font if header else self.label_font,
+                              state='normal')
+        self.cn.itemconfigure(slot['value'], state='normal')
+        self.cn.itemconfigure(slot['spark'], state='hidden' if header else 'normal')
+        self.cn.itemconfigure(slot['line'], state='normal', fill='gray20' if header else 'gray40')
+        slot['row'] = i
+        slot['rendered'] = {}
+
+    def _layout(self):
+        """Create/reuse items for currently visible rows and release items of rows scrolled out of view."""
+        visible = self._visible_rows()
+        for i in [i for i in self.slots if i not in visible]:
+            self._hide_slot(self.slots.pop(i))
+        t = timestamp()
+        for i in visible:
+            if i not in self.slots:
+                slot = self._new_slot()
+                self._assign_slot(slot, i)
+                self.slots[i] = slot
+            self._update_row(self.slots[i], t)
+
+    def _set(self, slot, item, text):
+        if slot['rendered'].get(item) != text:
+            slot['rendered'][item] = text
+            self.cn.itemconfigure(slot[item], text=text)
+
+    def _update_row(self, slot, t):
+        name, channel = self.rows[slot['row']]
+        unit = self.units.get(name)
+        if not unit:
+            return
+        dev = unit.dev
+        if channel is None:
+            text = name + ': ' + dev.model + ' [' + dev.serial + ']'
+            self._set(slot, 'name', text)
+            self._set(slot, 'value', '' if dev.connected() else '(' + dev.state + ')')
+            return
+        v = dev.get_status().get(channel)
+        if isinstance(v, FanStatus):
+            self._set(slot, 'name', v.name)
+            self._set(slot, 'value', format_value(v.pwm, '3.0f') + ' % ' + format_value(v.rpm, '6d') + ' rpm')
+        elif isinstance(v, SensorStatus):
+            self._set(slot, 'name', v.name)
+            self._set(slot, 'value', format_value(v.temp, '6.2f') + ' C')
+        self._update_spark(slot, unit.history.series(channel), t)
+
+    def _update_spark(self, slot, series, t):
+        last = series.last()
+        t_min = t - self.t_range
+        key = (last, int(t_min * self.spark_width / self.t_range))
+        if slot['rendered'].get('spark') == key:
+            return
+        slot['rendered']['spark'] = key
+        y0 = slot['row'] * self.row_height + 2
+        h = self.row_height - 5
+        x_f = self.t_range / self.spark_width
+        columns = {}
+        for ts, value in series.items(t_min):
+            columns[int((ts - t_min) / x_f)] = value
+        points = []
+        for x, value in columns.items():
+            points.append(self.spark_x + x)
+            points.append(y0 + h - min(max(value, 0), 100) * h / 100)
+        if len(points) < 4:
+            points = [0, 0, 0, 0]
+        self.cn.coords(slot['spark'], points)
+
+    def refresh(self):
+        self.refresh_job = self.after(self.refresh_interval, self.refresh)
+        signature = [(name, tuple(sorted(unit.dev.get_status()))) for name, unit in self.units.items()]
+        if signature != self.signature:
+            # units or channels changed: rebuild row list
+            self.signature = signature
+            self.rows = self._build_rows()
+            log.debug("OverviewCanvas: %d rows", len(self.rows))
+            for i in list(self.slots):
+                self._hide_slot(self.slots.pop(i))
+            self.cn.configure(scrollregion=(0, 0, self.spark_x + self.spark_width + 10,
+                                            len(self.rows) * self.row_height))
+        self._layout()
+
+
+# eof :-)
@@ -22,6 +22,106 @@ import logging as log
 import tkinter as tk
 from typing import Tuple, Optional
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def bin_window(t, v, t_min: float, x_f: float, width: int):
+    """
+    Vectorized (NumPy) binning of samples into pixel columns.
+
+    Samples must be in chronological order. Returns arrays (slot, avg, min, max)
+    for each pixel column that has samples.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    slot = ((t - t_min) / x_f).astype(np.intp)
+    keep = (slot >= 0) & (slot < width)
+    slot = slot[keep]
+    v = v[keep]
+    if slot.size == 0:
+        empty = np.empty(0)
+        return (np.empty(0, dtype=np.intp), empty, empty, empty)
+    starts = np.flatnonzero(np.concatenate(([True], slot[1:] != slot[:-1])))
+    count = np.diff(np.append(starts, slot.size))
+    avg = np.add.reduceat(v, starts) / count
+    return (slot[starts], avg, np.minimum.reduceat(v, starts), np.maximum.reduceat(v, starts))
+
+
+class PlotBins:
+    """
+    Running per-pixel aggregates (sum, count, min and max) for a TimePlot.
+
+    Bins are aligned to absolute time, so when time moves forward the
+    window is just shifted (and bins that fall off are cleared) instead
+    of recomputing everything from the raw samples. The last (rightmost)
+    bin is the one holding current time, so newest sample is always drawn.
+    """
+
+    def __init__(self, width: int, t_range: float):
+        self.w = width
+        self.n = width
+        self.x_f = t_range / width
+        self._clear(0, self.n)
+        self.first = None
+        self.last_t = None
+
+    def _clear(self, start: int, end: int):
+        if end - start >= self.n:
+            self.sums = [0.0] * self.n
+            self.count = [0] * self.n
+            self.mins = [0.0] * self.n
+            self.maxs = [0.0] * self.n
+            return
+        for b in range(start, end):
+            i = b % self.n
+            self.sums[i] = 0.0
+            self.count[i] = 0
+
+    def update(self, data, time: float) -> bool:
+        """Shift bins to end at the bin holding time and add new samples. Returns True if anything changed."""
+        first = int(time // self.x_f) - self.w + 1
+        changed = False
+        if self.first is None:
+            self.first = first
+        elif first > self.first:
+            self._clear(self.first, first)
+            self.first = first
+            changed = True
+
+        t_min = self.first * self.x_f
+        start = t_min if self.last_t is None else max(t_min, self.last_t)
+        for k, v in data.items(start):
+            if self.last_t is not None and k <= self.last_t:
+                continue
+            b = int(k // self.x_f)
+            if b >= self.first + self.n:
+                # newer than time (added on next update)
+                break
+            self.last_t = k
+            if b < self.first:
+                continue
+            i = b % self.n
+            if self.count[i]:
+                self.mins[i] = min(self.mins[i], v)
+                self.maxs[i] = max(self.maxs[i], v)
+            else:
+                self.mins[i] = v
+                self.maxs[i] = v
+            self.sums[i] += v
+            self.count[i] += 1
+            changed = True
+        return changed
+
+    def columns(self):
+        """Iterate (slot, avg, min, max) for each pixel column that has samples."""
+        for slot in range(self.w):
+            i = (self.first + slot) % self.n
+            if self.count[i]:
+                yield slot, self.sums[i] / self.count[i], self.mins[i], self.maxs[i]
+
 
 class TimePlot(tk.Canvas):
     def __init__(self, master, data,
@@ -30,6 +130,9 @@ class TimePlot(tk.Canvas):
                  width: Optional[int] = 300,
                  height: Optional[int] = 200,
                  color: str = 'red',
+                 envelope: Optional[str] = None,
+                 incremental: bool = True,
+                 use_numpy: bool = False,
                  *args, **kwargs):
         super().__init__(master, width=width, height=height, *args, **kwargs)
 
@@ -37,46 +140,152 @@ class TimePlot(tk.Canvas):
         self.y_range = y_range
         self.t_range = t_range
         self.color = color
+        self.envelope = envelope
         self.w = width
         self.h = height
         self.plot = None
+        self.plot_env = None
+        self.points = None
+        self.last = None
+        if use_numpy and np is None:
+            log.debug("TimePlot: numpy not available, using python binning")
+        self.use_numpy = use_numpy and np is not None
+        self.rollup = self._select_rollup()
+        self.bins = None
+        if incremental and not self.use_numpy and not self.rollup:
+            self.bins = PlotBins(width, t_range)
 
-    def update_plot(self, time):
-        t = int(time)
-        log.debug("TimePlot:update %d", t)
-        t_min = t - self.t_range
+    def _select_rollup(self):
+        """Pick the coarsest rollup tier (if any) that still has at least one bucket per pixel."""
         x_f = self.t_range / self.w
-        y_f = (self.y_range[1] - self.y_range[0]) / (self.h - 1)
-        sums = [0 for i in range(self.w + 1)]
-        count = [0 for i in range(self.w + 1)]
+        best = None
+        for r in getattr(self.data, 'rollups', ()):
+            if r.step <= x_f and (best is None or r.step > best.step):
+                best = r
+        if best:
+            log.debug("TimePlot: using %ds rollup for %ds range", best.step, self.t_range)
+        return best
 
-        for k, v in self.data.items():
-            if k >= t_min:
-                slot = int((k - t_min) / x_f)
-                # print(k,slot)
-                sums[slot] += float(v)
-                count[slot] += 1
+    def update_plot(self, time):
+        log.debug("TimePlot:update %.3f", time)
+        t_min = time - self.t_range
+        if self.rollup:
+            self._update_rollup(t_min)
+            return
+        if self.use_numpy:
+            self._update_numpy(t_min)
+            return
+        if self.bins:
+            if not self.bins.update(self.data, time):
+                return
+            columns = list(self.bins.columns())
+        else:
+            columns = list(self._columns(t_min))
+        self._draw_columns(columns)
 
+    def _draw_columns(self, columns):
+        y_f = (self.y_range[1] - self.y_range[0]) / (self.h - 1)
         points = []
-        for i in range(self.w):
-            if count[i]:
-                points.append(i)
-                a = sums[i] / count[i]
-                # if (a < self.y_range[0]):
-                #     a=self.y_range[0]
-                # if (a > self.y_range[1]):
-                #     a=self.y_range[1]
-                a -= self.y_range[0]
-                points.append(self.h - int(a / y_f) - 1)
+        for i, a, a_min, a_max in columns:
+            points.append(i)
+            # if (a < self.y_range[0]):
+            #     a=self.y_range[0]
+            # if (a > self.y_range[1]):
+            #     a=self.y_range[1]
+            a -= self.y_range[0]
+            points.append(self.h - int(a / y_f) - 1)
+
+        env = None
+        if self.envelope:
+            env = [(i, self.h - int((a_max - self.y_range[0]) / y_f) - 1) for i, _, _, a_max in columns]
+            env += [(i, self.h - int((a_min - self.y_range[0]) / y_f) - 1) for i, _, a_min, _ in reversed(columns)]
+        self._draw(points, env)
+
+    def _update_rollup(self, t_min):
+        x_f = self.t_range / self.w
+        key = (int(t_min // x_f), self.rollup.last())
+        if key == self.last:
+            return
+        self.last = key
+
+        sums = {}
+        for bt, b_sum, b_min, b_max, b_count in self.rollup.items(t_min):
+            slot = max(0, int((bt - t_min) / x_f))
+            if slot >= self.w:
+                continue
+            if slot in sums:
+                c = sums[slot]
+                c[0] += b_sum
+                c[1] = min(c[1], b_min)
+                c[2] = max(c[2], b_max)
+                c[3] += b_count
+            else:
+                sums[slot] = [b_sum, b_min, b_max, b_count]
+        self._draw_columns([(i, c[0] / c[3], c[1], c[2]) for i, c in sums.items()])
+
+    def _update_numpy(self, t_min):
+        x_f = self.t_range / self.w
+        key = (int(t_min // x_f), self.data.last())
+        if key == self.last:
+            return
+        self.last = key
+
+        t, v = self.data.window(t_min)
+        slot, avg, v_min, v_max = bin_window(t, v, t_min, x_f, self.w)
+        y_f = (self.y_range[1] - self.y_range[0]) / (self.h - 1)
+        y = self.h - ((avg - self.y_range[0]) / y_f).astype(np.intp) - 1
+        points = np.column_stack((slot, y)).ravel().tolist()
 
+        env = None
+        if self.envelope:
+            y_max = self.h - ((v_max - self.y_range[0]) / y_f).astype(np.intp) - 1
+            y_min = self.h - ((v_min - self.y_range[0]) / y_f).astype(np.intp) - 1
+            env = np.concatenate((np.column_stack((slot, y_max)),
+                                  np.column_stack((slot, y_min))[::-1])).tolist()
+        self._draw(points, env)
+
+    def _draw(self, points, env):
         if len(points) >= 4:
             if points[-2] < self.w - 1:
                 points.extend((self.w - 1, points[-1]))
             # points.extend((self.w -1, self.h - 1, points[0], self.h - 1))
+            if (points, env) == self.points:
+                return
+            self.points = (points, env)
+            if env:
+                if self.plot_env:
+                    self.coords(self.plot_env, env)
+                else:
+                    self.plot_env = self.create_polygon(env, fill=self.envelope, outline=self.envelope)
+                    if self.plot:
+                        self.tag_raise(self.plot)
             if self.plot:
                 self.coords(self.plot, points)
             else:
                 self.plot = self.create_line(points, fill=self.color)
 
+    def _columns(self, t_min):
+        x_f = self.t_range / self.w
+        sums = [0 for i in range(self.w + 1)]
+        count = [0 for i in range(self.w + 1)]
+        mins = [0 for i in range(self.w + 1)]
+        maxs = [0 for i in range(self.w + 1)]
+
+        for k, v in self.data.items(t_min):
+            slot = int((k - t_min) / x_f)
+            if slot > self.w:
+                continue
+            if count[slot]:
+                mins[slot] = min(mins[slot], v)
+                maxs[slot] = max(maxs[slot], v)
+            else:
+                mins[slot] = maxs[slot] = v
+            sums[slot] += v
+            count[slot] += 1
+
+        for i in range(self.w):
+            if count[i]:
+                yield i, sums[i] / count[i], mins[i], maxs[i]
+
 
 # eof :-)
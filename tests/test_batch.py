@@ -0,0 +1,166 @@
+#
+# test_batch.py - Tests for pipelined (batched) queries
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import os
+import socket
+import sys
+import threading
+
+import pytest
+
+program_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, program_dir)
+sys.path.insert(0, os.path.join(program_dir, 'scpi_lite'))
+
+from fanpico.network import TCPDevice  # noqa: E402
+from fanpico.simulator import SimDevice, SimServer  # noqa: E402
+from fanpico.status import Batch, ResponseError  # noqa: E402
+
+IDN = ('TJKO Industries', 'FANPICO-0804D')
+IDN_LINE = b'TJKO Industries,FANPICO-0804D,E6614C311B7A8F2D,1.6.0\r\n'
+STATUS = b'fan1,"Fan 1",1200,40.0,50.0\r\nfan2,"Fan 2",0,0.0,0.0\r\nsensor1,"Sensor 1",35.2\r\n'
+
+
+def test_commands():
+    batch = Batch(['MEAS:FAN1:RPM?', 'MEAS:FAN2:RPM?', 'R?', '*IDN?', 'MEAS:FAN1:PWM?'], IDN)
+    assert batch.commands() == ['MEAS:FAN1:RPM?', 'MEAS:FAN2:RPM?', '*IDN?', 'R?', '*IDN?',
+                                '*IDN?', 'MEAS:FAN1:PWM?', '*IDN?']
+
+
+def test_single_line():
+    batch = Batch(['MEAS:FAN1:RPM?', 'MEAS:FAN2:RPM?'], IDN)
+    assert not batch.receive(b'1200\r\n\r\n0\r\n')
+    assert batch.receive(IDN_LINE)
+    assert batch.result() == ['1200', '0']
+
+
+def test_multi_line():
+    batch = Batch(['MEAS:FAN1:RPM?', 'R?', '*IDN?', 'R?'], IDN)
+    data = b'1200\r\n' + IDN_LINE + STATUS + IDN_LINE + IDN_LINE + IDN_LINE
+    # responses split at arbitrary points
+    for i in range(0, len(data), 7):
+        batch.receive(data[i:i + 7])
+    assert batch.done()
+    res = batch.result()
+    assert res[0] == '1200'
+    assert res[1] == STATUS.decode().replace('\r', '').strip()
+    assert res[2] == IDN_LINE.decode().strip()
+    # empty multi-line response
+    assert res[3] == ''
+
+
+def test_unanswered_query():
+    # unit does not answer unknown queries: response count does not match
+    batch = Batch(['CONF:FAN1:NAME?', 'R?', 'MEAS:FAN1:RPM?'], IDN)
+    assert batch.receive(IDN_LINE + STATUS + IDN_LINE + b'1200\r\n' + IDN_LINE)
+    with pytest.raises(ResponseError):
+        batch.result()
+
+
+def test_unanswered_query_before_idn():
+    batch = Batch(['CONF:FAN1:NAME?', '*IDN?'], IDN)
+    assert batch.receive(IDN_LINE)
+    with pytest.raises(ResponseError):
+        batch.result()
+
+
+def test_no_identity():
+    batch = Batch(['*IDN?'])
+    assert batch.receive(b'\r\n' + IDN_LINE)
+    assert batch.result() == [IDN_LINE.decode().strip()]
+    with pytest.raises(ValueError):
+        Batch(['R?'])
+
+
+def test_simulator():
+    sim = SimDevice('fans=2,mbfans=0,sensors=1,latency=0,jitter=0')
+    idn = (sim.manufacturer, sim.model)
+    res = sim.batch(Batch(['R?', 'MEAS:FAN1:RPM?', 'MEAS:SENSOR1:TEMP?'], idn))
+    assert len(res[0].split('\n')) == 3
+    int(res[1])
+    float(res[2])
+    with pytest.raises(ResponseError):
+        sim.batch(Batch(['CONF:FAN1:NAME?', 'R?', 'MEAS:FAN1:RPM?'], idn))
+
+
+@pytest.fixture
+def server():
+    srv = SimServer(('127.0.0.1', 0), 'fans=2,mbfans=0,sensors=1,latency=0.1,jitter=0')
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield f'127.0.0.1:{srv.server_address[1]}'
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_tcp_unanswered_query(server):
+    dev = TCPDevice(server, timeout=5)
+    try:
+        with pytest.raises(ResponseError):
+            dev.batch(Batch(['CONF:FAN1:NAME?', 'R?', 'MEAS:FAN1:RPM?'], dev.idn))
+        # connection is still in sync
+        res = dev.batch(Batch(['MEAS:FAN1:RPM?', 'R?'], dev.idn))
+        int(res[0])
+        assert len(res[1].split('\n')) == 3
+    finally:
+        dev.close()
+
+
+def test_tcp_timeout(server):
+    dev = TCPDevice(server, timeout=5)
+    dev.timeout = 0.05
+    with pytest.raises(socket.timeout):
+        dev.batch(Batch(['R?'], dev.idn))
+    # connection is not used after a timeout (late response would be read as response to next query)
+    assert dev.broken
+    with pytest.raises(ConnectionError):
+        dev.query('MEAS:FAN1:RPM?')
+    dev.close()
+
+
+def test_async_transport(server):
+    try:
+        from fanpico.poller import AsyncTCPTransport
+    except ImportError as err:
+        pytest.skip(f"poller not available: {err}")
+
+    async def run():
+        transport = AsyncTCPTransport(server)
+        await transport.open()
+        idn = await transport.query('*IDN?')
+        transport.idn = tuple(idn.split(',')[:2])
+        res = await transport.batch(Batch(['R?', 'MEAS:FAN1:RPM?'], transport.idn))
+        assert len(res[0].split('\n')) == 3
+        int(res[1])
+        with pytest.raises(ResponseError):
+            await transport.batch(Batch(['CONF:FAN1:NAME?', 'MEAS:FAN1:RPM?'], transport.idn))
+        with pytest.raises(asyncio.TimeoutError):
+            await transport.batch(Batch(['R?'], transport.idn), timeout=0.05)
+        # connection is closed after a timeout
+        assert transport.closed
+        with pytest.raises(ConnectionError):
+            await transport.batch(Batch(['MEAS:FAN1:RPM?'], transport.idn))
+        transport.close()
+
+    asyncio.run(run())
+
+
+# eof :-)
@@ -0,0 +1,134 @@
+#
+# test_network.py - Tests for TCP connections to (simulated) FanPico units
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fanpico.network import (ConnectionPool, TCPDevice, TelnetFilter, parse_address,  # noqa: E402
+                             IAC, DO, DONT, WILL, WONT, SB, SE)
+from fanpico.simulator import SimServer  # noqa: E402
+from fanpico.status import Batch, parse_status  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    srv = SimServer(('127.0.0.1', 0), 'fans=4,mbfans=2,sensors=1,latency=0,jitter=0')
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield f'127.0.0.1:{srv.server_address[1]}'
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_query(server):
+    dev = TCPDevice(server, timeout=2)
+    try:
+        assert dev.manufacturer == 'TJKO Industries'
+        assert dev.model == 'FANPICO-0402SIM'
+        status = parse_status(dev.query('R?', multi_line=True))
+        assert sorted(status) == ['fan1', 'fan2', 'fan3', 'fan4', 'mbfan1', 'mbfan2', 'sensor1']
+        assert float(dev.query('MEAS:SENSOR1:TEMP?')) > 0
+    finally:
+        dev.close()
+
+
+def test_batch(server):
+    dev = TCPDevice(server, timeout=2)
+    try:
+        res = dev.batch(Batch(['MEAS:FAN1:RPM?', 'R?', '*IDN?', 'R?', 'MEAS:FAN2:PWM?'], dev.idn))
+        assert len(res) == 5
+        int(res[0])
+        assert len(res[1].split('\n')) == 7
+        assert res[2].startswith('TJKO Industries,FANPICO-0402SIM,')
+        assert len(parse_status(res[3])) == 7
+        float(res[4])
+        assert dev.batch(Batch([])) == []
+    finally:
+        dev.close()
+
+
+def test_pool_reuse(server):
+    pool = ConnectionPool(max_idle=1)
+    dev = pool.acquire('tcp', server)
+    dev.close()
+    # closing twice must not add the connection to the pool twice
+    dev.close()
+    assert len(pool.idle[('tcp', server)]) == 1
+    dev2 = pool.acquire('tcp', server)
+    assert dev2 is dev
+    assert dev2.query('MEAS:FAN1:RPM?')
+    # another connection while first one is in use
+    dev3 = pool.acquire('tcp', server)
+    assert dev3 is not dev
+    dev2.close()
+    dev3.close()
+    assert len(pool.idle[('tcp', server)]) == 1
+    pool.close()
+    assert pool.idle == {}
+
+
+def test_pool_drops_broken(server):
+    pool = ConnectionPool()
+    dev = pool.acquire('tcp', server)
+    dev.broken = True
+    dev.close()
+    assert not pool.idle.get(('tcp', server))
+    assert pool.acquire('tcp', server) is not dev
+
+
+def test_telnet_filter_split():
+    f = TelnetFilter()
+    # option negotiation split between chunks
+    assert f.feed(bytes((ord('A'), IAC))) == (b'A', b'')
+    assert f.feed(bytes((DO,))) == (b'', b'')
+    assert f.feed(bytes((1, ord('B'), IAC, WILL, 3))) == (b'B', bytes((IAC, WONT, 1, IAC, DONT, 3)))
+    # escaped IAC (data byte 255)
+    assert f.feed(bytes((IAC,))) == (b'', b'')
+    assert f.feed(bytes((IAC, ord('C')))) == (b'\xffC', b'')
+    # subnegotiation split between chunks
+    assert f.feed(bytes((IAC, SB, 24, 1))) == (b'', b'')
+    assert f.feed(bytes((IAC,))) == (b'', b'')
+    assert f.feed(bytes((SE, ord('D'), IAC, WONT, 1))) == (b'D', b'')
+
+
+@pytest.mark.parametrize('address,default_port,expected', [
+    ('host:5025', None, ('host', 5025)),
+    ('host', 23, ('host', 23)),
+    ('10.0.0.1:23', None, ('10.0.0.1', 23)),
+    ('[::1]:5025', None, ('::1', 5025)),
+    ('[::1]', 23, ('::1', 23)),
+    ('::1', 23, ('::1', 23)),
+])
+def test_parse_address(address, default_port, expected):
+    assert parse_address(address, default_port) == expected
+
+
+@pytest.mark.parametrize('address', ['host', '[::1]', 'host:port'])
+def test_parse_address_invalid(address):
+    with pytest.raises(ValueError):
+        parse_address(address)
+
+
+# eof :-)
@@ -0,0 +1,75 @@
+#
+# test_time_plot.py - Tests for TimePlot binning
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('tkinter')
+
+from fanpico.series import TimeSeries  # noqa: E402
+from gui.time_plot import PlotBins, TimePlot, bin_window, np  # noqa: E402
+
+WIDTH = 20
+T_RANGE = 60
+X_F = T_RANGE / WIDTH
+
+
+def add_samples(series, b):
+    # samples early in the bin (before current time within the bin), so
+    # binning relative to t_min puts them to same pixel column
+    for u in (0.5, 1.0, 2.0):
+        series.append(b * X_F + u, float((b * 7 + int(u * 10)) % 23))
+
+
+def flatten(columns):
+    return [x for column in columns for x in column]
+
+
+def test_columns():
+    series = TimeSeries(capacity=1000)
+    bins = PlotBins(WIDTH, T_RANGE)
+    plot = types.SimpleNamespace(t_range=T_RANGE, w=WIDTH, data=series)
+    # (skip ahead to test clearing bins that fall off the window)
+    for n in list(range(10, 50)) + list(range(60, 70)) + [100]:
+        add_samples(series, n)
+        time = n * X_F + 2.25
+        t_min = time - T_RANGE
+        assert bins.update(series, time)
+        columns = list(bins.columns())
+        expected = list(TimePlot._columns(plot, t_min))
+        assert flatten(columns) == pytest.approx(flatten(expected))
+        # newest sample is drawn in last column
+        assert columns[-1][0] == WIDTH - 1
+        assert columns[-1][2] <= series.last()[1] <= columns[-1][3]
+        if np is not None:
+            t, v = series.window(t_min)
+            slot, avg, v_min, v_max = bin_window(t, v, t_min, X_F, WIDTH)
+            assert flatten(columns) == pytest.approx(flatten(zip(slot.tolist(), avg.tolist(),
+                                                                 v_min.tolist(), v_max.tolist())))
+    # nothing new
+    assert not bins.update(series, time)
+
+
+# eof :-)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+#
+# benchmark.py - Benchmarks for FanPico Monitor polling, parsing and plotting
+#
+#
+# Copyright (C) 2023 Timo Kokkonen <tjko@iki.fi>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys
+import os
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+
+program_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, program_dir)
+sys.path.insert(0, program_dir + "/scpi_lite")
+
+from fanpico.device import FanPico
+from fanpico.history import UnitHistory
+from fanpico.series import TimeSeries
+from fanpico.simulator import SimDevice
+from fanpico.status import parse_status, QueryPlan
+
+try:
+    # plot binning does not need a display, but tkinter must be installed
+    import tkinter as tk
+    from gui.time_plot import TimePlot, np
+except ImportError as err:
+    print(f"warning: plot benchmarks disabled: {err}", file=sys.stderr)
+    TimePlot = None
+
+
+if TimePlot:
+    class HeadlessCanvas(tk.Canvas):
+        """Canvas that is never created (so no display is needed), drawing calls do nothing."""
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def coords(self, *args):
+            pass
+
+        def create_line(self, *args, **kwargs):
+            return 1
+
+        def create_polygon(self, *args, **kwargs):
+            return 2
+
+        def tag_raise(self, *args):
+            pass
+
+    class BenchPlot(TimePlot, HeadlessCanvas):
+        """TimePlot without a window: update_plot() does everything except the actual drawing."""
+
+
+class NullEngine:
+    """Stand-in poll engine, so FanPico objects can be created without any I/O."""
+
+    def add(self, unit):
+        pass
+
+    def remove(self, unit):
+        pass
+
+
+def sim_device(channels):
+    """Simulated unit with roughly given number of channels (2/3 fans, 1/3 sensors)."""
+    fans = max(1, channels * 2 // 3)
+    return SimDevice(f"fans={fans},mbfans=0,sensors={max(1, channels - fans)},seed=1,latency=0,jitter=0")
+
+
+def measure(func, min_time=0.2, repeat=5):
+    """Return list of per-call times (seconds), one for each repeat."""
+    n = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(n):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeat or n >= 1 << 20:
+            break
+        n *= 2
+    res = [elapsed / n]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(n):
+            func()
+        res.append((time.perf_counter() - start) / n)
+    return res
+
+
+class Benchmark:
+    def __init__(self, min_time, repeat):
+        self.min_time = min_time
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, name, func, **params):
+        times = measure(func, self.min_time, self.repeat)
+        res = {
+            'name': name,
+            'params': params,
+            'median_us': statistics.median(times) * 1e6,
+            'min_us': min(times) * 1e6,
+            'mean_us': statistics.mean(times) * 1e6,
+        }
+        self.results.append(res)
+        param_str = ','.join(f'{k}={v}' for k, v in params.items())
+        print(f"{name:24s} {param_str:32s} {res['median_us']:12.2f} us", file=sys.stderr)
+
+    def parsing(self, channels):
+        for c in channels:
+            text = sim_device(c).status(t=10.0)
+            self.run('parse_status', lambda: parse_status(text), channels=c, bytes=len(text))
+            # query plan polling only fan RPMs
+            status = parse_status(text)
+            plan = QueryPlan('fan:rpm')
+            responses = [(k, f, '1234') for k, f, _ in plan.commands(status)]
+            self.run('plan_apply', lambda: plan.apply(status, responses), channels=c,
+                     bytes=sum(len(r) for _, _, r in responses))
+
+    def publish(self, channels):
+        for c in channels:
+            text = sim_device(c).status(t=10.0)
+            unit = FanPico('sim://', engine=NullEngine())
+            self.run('publish', lambda: unit.publish(text), channels=c)
+            self.run('get_status', unit.get_status, channels=c)
+
+    def ingestion(self, channels, lengths):
+        for c in channels:
+            status = dict(parse_status(sim_device(c).status(t=10.0)))
+            for length in lengths:
+                history = UnitHistory('bench', capacity=length)
+                clock = iter(range(1 << 62))
+
+                def add():
+                    status['last_update'] = next(clock)
+                    history.add(status)
+                self.run('history_add', add, channels=c, capacity=length)
+
+    def units(self, counts, channels=16):
+        """Full per-poll path (parse, publish, ingest) for given number of units."""
+        text = sim_device(channels).status(t=10.0)
+        for count in counts:
+            units = [(FanPico('sim://', engine=NullEngine()), UnitHistory('bench')) for _ in range(count)]
+
+            def poll():
+                for unit, history in units:
+                    unit.publish(text)
+                    status = dict(unit.get_status())
+                    status['last_update'] = poll.t
+                    history.add(status)
+                poll.t += 1
+            poll.t = 0
+            self.run('poll_units', poll, units=count, channels=channels)
+
+    def plotting(self, ranges, width=150):
+        """Plot update (as done by the GUI) after each new sample, for each binning method."""
+        if TimePlot is None:
+            return
+        for t_range in ranges:
+            def series(rollups=()):
+                data = TimeSeries(capacity=min(t_range, 1800) * 4, rollups=rollups)
+                for t in range(2 * t_range):
+                    data.append(float(t), 50.0 + (t % 37))
+                return data
+
+            def updates(plot):
+                clock = iter(range(2 * t_range, 1 << 62))
+
+                def update():
+                    t = float(next(clock))
+                    plot.data.append(t, 50.0 + (t % 37))
+                    plot.update_plot(t)
+                plot.update_plot(2 * t_range - 1.0)
+                return update
+
+            plot = BenchPlot(None, series(), t_range=t_range, width=width, incremental=False)
+            self.run('plot_python', updates(plot), t_range=t_range)
+
+            plot = BenchPlot(None, series(), t_range=t_range, width=width)
+            self.run('plot_incremental', updates(plot), t_range=t_range)
+
+            if np is not None:
+                plot = BenchPlot(None, series(), t_range=t_range, width=width, use_numpy=True)
+                self.run('plot_numpy', updates(plot), t_range=t_range)
+
+            plot = BenchPlot(None, series(rollups=((10, 1500), (60, 1500), (600, 1500))),
+                             t_range=t_range, width=width)
+            if plot.rollup:
+                self.run('plot_rollup', updates(plot), t_range=t_range, step=plot.rollup.step)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=program_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print comparison against baseline report, return number of regressions."""
+    old = {(r['name'], json.dumps(r['params'], sort_keys=True)): r for r in baseline['results']}
+    regressions = 0
+    print(f"\nComparison against {baseline.get('revision')} ({baseline.get('timestamp')}):")
+    for r in results:
+        b = old.get((r['name'], json.dumps(r['params'], sort_keys=True)))
+        if not b:
+            continue
+        ratio = r['median_us'] / b['median_us'] if b['median_us'] else 0
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        param_str = ','.join(f'{k}={v}' for k, v in r['params'].items())
+        print(f"{r['name']:24s} {param_str:32s} {b['median_us']:10.2f} -> {r['median_us']:10.2f} us "
+              f"({ratio:5.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FanPico Monitor benchmarks')
+    parser.add_argument('-o', '--output', help='write JSON report to file')
+    parser.add_argument('-c', '--compare', help='compare against earlier JSON report')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio reported as regression (default: 1.25)')
+    parser.add_argument('--quick', action='store_true', help='shorter run (less accurate)')
+    args = parser.parse_args()
+
+    bench = Benchmark(min_time=0.05 if args.quick else 0.5, repeat=3 if args.quick else 5)
+    channels = [4, 16, 64]
+    bench.parsing(channels)
+    bench.publish(channels)
+    bench.ingestion(channels, [256, 4096])
+    bench.units([1, 10, 50])
+    bench.plotting([60, 3600, 86400])
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__ if TimePlot and np is not None else None,
+        'results': bench.results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(bench.results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# eof :-)